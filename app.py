@@ -1,77 +1,236 @@
-from flask import Flask, render_template, request, send_from_directory
+from flask import Flask, render_template, request, send_from_directory, jsonify, url_for, abort, g, Response, redirect
 import os
+import sys
+import time
+import base64
+import binascii
 import numpy as np
-import cv2
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2, preprocess_input
-from disease_info import disease_data  # Import disease details
-try:
-    from waitress import serve
-    WAITRESS_AVAILABLE = True
-except ImportError:
-    WAITRESS_AVAILABLE = False
-    print("Warning: waitress not available, using Flask development server")
-from download_model import download_model_from_drive
-import gdown # Added gdown for Google Drive download
+from label_catalog import LABELS, lookup, label_name, make_label
+from image_loader import DecodedImage, HEADER_PROBE_BYTES, MAX_IMAGE_PIXELS
+from engine import (
+    CNN_MODEL_VERSION, BATCH_MAX_SIZE, metrics, stage_latency, model_registry, prediction_cache, tta_budget,
+    rice_batcher, plant_validator, analyze_upload, validate_upload, prediction_analysis, is_rice_or_sugarcane,
+    preprocess_for_cnn, interpret_predictions, predict_probabilities_batch, allowed_file
+)
+from upload_store import UploadStore
+from jobs import JobQueue, QueueFull
+from live_stream import StreamScheduler, StreamLimitReached
+from fragment_cache import TemplateCache
+from static_assets import AssetManifest, PrecompressedPages
+from upload_guard import GuardedRequest, UploadRejected, check_image_header, part_rejection
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
 
-# Fixed disease mapping - removed duplicates and ensured consistency
-disease_mapping = {
-    0: "BacterialBlight",
-    1: "Banded Chlorosis",
-    2: "Brownspot (Rice)",
-    3: "Brown Spot (Sugarcane)",
-    4: "BrownRust",
-    5: "Dried Leaves",
-    6: "Grassy shoot",
-    7: "Healthy Leaves",
-    8: "Leafsmut",
-    9: "Tungro",
-    10: "Yellow Leaf"
+# Oversized bodies are refused from their Content-Length; file parts are
+# header-checked while streaming (see upload_guard.py)
+MAX_UPLOAD_MB = float(os.environ.get('MAX_UPLOAD_MB', 16))
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
+app.request_class = GuardedRequest
+
+# Class labels and disease details come from the shared catalog (label_catalog.py)
+
+def invalid_details(symptom, strategy):
+    return make_label("Invalid Input", {
+        "Type": "N/A",
+        "Symptoms": [symptom],
+        "Causes": ["N/A"],
+        "Management Strategies": [strategy]
+    }).details
+
+# "Invalid Input" result details by rejection reason, built once
+UPLOAD_STRATEGY = "Please upload a JPEG or PNG photo of a rice or sugarcane leaf."
+INVALID_DETAILS = {
+    "too_large": invalid_details(f"Upload is larger than {MAX_UPLOAD_MB:.0f} MB.", UPLOAD_STRATEGY),
+    "unsupported_format": invalid_details("Only JPEG and PNG images are accepted.", UPLOAD_STRATEGY),
+    "too_many_pixels": invalid_details(
+        f"Image has more than {MAX_IMAGE_PIXELS / 1e6:.0f} megapixels.", UPLOAD_STRATEGY),
+    "invalid_file": invalid_details(
+        "Invalid file type. Please upload a valid image.",
+        "Ensure the uploaded file is an image of rice or sugarcane disease."),
+    "busy": invalid_details(
+        "The server is busy analyzing other images, so this one was not analyzed.",
+        "Please submit the same image again."),
+    "too_dark": invalid_details(
+        "Uploaded image is too dark or black. Please upload a clear image.",
+        "Ensure the image has enough light and clear details."),
+    "not_plant": invalid_details(
+        "Uploaded image does not appear to be a plant leaf.",
+        "Please upload a clear image of rice or sugarcane leaves."),
+    "low_confidence": invalid_details(
+        "The image does not match rice or sugarcane diseases.",
+        "Please upload a valid image of rice or sugarcane."),
+    "failed": invalid_details(
+        "The uploaded image could not be analyzed.",
+        "Please upload the image again."),
 }
 
-# Ensure uploads directory exists
-if not os.path.exists('uploads'):
-    os.makedirs('uploads')
-
-# Load Models with proper error handling
-CNN_MODEL_PATH = "../model/Dataset_cnn.h5"
-
-# Google Drive model URL (you'll need to upload your model and get this URL)
-MODEL_DRIVE_URL = "https://drive.google.com/uc?id=YOUR_MODEL_FILE_ID"
-
-rice_model = None
-plant_model = None
-
-try:
-    print("Loading CNN model...")
-    rice_model = load_model(CNN_MODEL_PATH)
-    print("✅ CNN model loaded successfully")
-except Exception as e:
-    print(f"❌ Failed to load CNN model: {e}")
-    print("Attempting to download model...")
-    try:
-        download_model_from_drive()
-        rice_model = load_model(CNN_MODEL_PATH)
-        print("✅ CNN model downloaded and loaded successfully")
-    except Exception as download_error:
-        print(f"❌ Failed to download model: {download_error}")
-        raise RuntimeError(f"Could not load or download the model: {download_error}")
-
-# Load Pretrained Model for Detection
-try:
-    print("Loading MobileNetV2 model...")
-    plant_model = MobileNetV2(weights="imagenet")
-    print("✅ MobileNetV2 model loaded successfully")
-except Exception as e:
-    print(f"❌ Failed to load MobileNetV2 model: {e}")
-    raise RuntimeError(f"Could not load MobileNetV2 model: {e}")
+# Content-addressed upload store; a background sweeper keeps disk usage flat
+upload_store = UploadStore(
+    root=os.environ.get('UPLOAD_DIR', 'uploads'),
+    max_bytes=int(float(os.environ.get('UPLOAD_STORE_MAX_MB', 200)) * 1024 * 1024),
+    ttl_seconds=int(float(os.environ.get('UPLOAD_TTL_HOURS', 24)) * 3600),
+    sweep_interval=int(os.environ.get('UPLOAD_SWEEP_SECONDS', 300))
+)
+UPLOAD_CACHE_SECONDS = 24 * 3600
+
+# Fingerprinted responsive images from `python build_assets.py` (plain /static files until built)
+assets = AssetManifest(app.static_folder)
+app.jinja_env.globals["assets"] = assets
+static_pages = PrecompressedPages()
+
+# JSON API limits
+API_MAX_IMAGES = int(os.environ.get('API_MAX_IMAGES', 16))
+
+# Camera page: captures are resized client-side so the shorter side is CAMERA_UPLOAD_MIN_SIDE px
+# and JPEG-encoded at CAMERA_JPEG_QUALITY; scan mode streams a small frame every CAMERA_SCAN_INTERVAL_MS
+CAMERA_UPLOAD_MIN_SIDE = int(os.environ.get('CAMERA_UPLOAD_MIN_SIDE', 448))
+CAMERA_JPEG_QUALITY = float(os.environ.get('CAMERA_JPEG_QUALITY', 0.85))
+CAMERA_SCAN_QUALITY = float(os.environ.get('CAMERA_SCAN_QUALITY', 0.7))
+CAMERA_SCAN_INTERVAL_MS = int(os.environ.get('CAMERA_SCAN_INTERVAL_MS', 250))
+UPLOAD_SOURCES = ("camera", "file", "scan")
+
+# Asynchronous uploads (opt-in): the form POST returns at once and a bounded job queue runs the analysis
+ASYNC_UPLOADS = os.environ.get('ASYNC_UPLOADS', '0') == '1'
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 32))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 600))
+JOB_MAX_WAIT_SECONDS = float(os.environ.get('JOB_MAX_WAIT_SECONDS', 10))
+JOB_RETRY_AFTER_SECONDS = 5
+
+def run_upload_job(payload):
+    """Job body: analyzes a stored upload. Jobs carry (file name, tiled), not the bytes, to keep the queue small."""
+    stored_name, tiled = payload
+    data = upload_store.read(stored_name)
+    if data is None:
+        raise LookupError(f"upload {stored_name} was evicted before it was analyzed")
+    analysis = analyze_upload(data, tiled=tiled)
+    record_rejection(analysis)
+    return analysis
+
+upload_jobs = JobQueue(
+    run_upload_job,
+    max_pending=JOB_QUEUE_SIZE,
+    workers=JOB_WORKERS,
+    result_ttl=JOB_RESULT_TTL,
+    name="upload_jobs"
+)
+
+# Live scan streams: latest-frame-wins sessions classified in shared batches, smoothed with an EMA
+STREAM_MAX_SESSIONS = int(os.environ.get('STREAM_MAX_SESSIONS', 32))
+STREAM_EMA_ALPHA = float(os.environ.get('STREAM_EMA_ALPHA', 0.3))
+STREAM_IDLE_TIMEOUT = int(os.environ.get('STREAM_IDLE_TIMEOUT', 30))
+STREAM_MAX_FRAME_BYTES = int(os.environ.get('STREAM_MAX_FRAME_KB', 512)) * 1024
+
+def classify_stream_frames(frames):
+    """Scores a batch of live frames: darkness and green checks, then one shared CNN batch.
+
+    The MobileNetV2 plant check is skipped to keep the frame rate up; frames
+    without enough leaf-green are reported as "not_plant".
+    """
+    results = [None] * len(frames)
+    pending = []
+    for i, data in enumerate(frames):
+        decoded = DecodedImage.from_bytes(data)
+        if decoded is None:
+            results[i] = ("undecodable", None)
+        elif plant_validator.check_darkness(decoded) is not None:
+            results[i] = ("too_dark", None)
+        elif not is_rice_or_sugarcane(decoded):
+            results[i] = ("not_plant", None)
+        else:
+            # Submitted together, so the micro-batcher runs them as one forward pass
+            pending.append((i, rice_batcher.submit(preprocess_for_cnn(decoded))))
+    for i, future in pending:
+        results[i] = ("ok", future.result())
+    return results
+
+stream_scheduler = StreamScheduler(
+    classify_stream_frames,
+    max_sessions=STREAM_MAX_SESSIONS,
+    max_batch_size=BATCH_MAX_SIZE,
+    alpha=STREAM_EMA_ALPHA,
+    idle_timeout=STREAM_IDLE_TIMEOUT,
+    name="live_stream"
+)
+
+# Hot-path instrumentation, exported at /metrics in Prometheus text format
+# (the registry and the per-stage histogram live in engine.py)
+request_latency = metrics.histogram(
+    "darts_request_duration_seconds", "End-to-end request latency by endpoint.", ["endpoint", "method"])
+upload_bytes = metrics.histogram(
+    "darts_upload_bytes", "Size of uploaded images by capture source.", ["source"],
+    buckets=(16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6))
+validation_rejections = metrics.counter(
+    "darts_validation_rejections_total", "Uploads rejected, by the validation step that rejected them.", ["step"])
+metrics.gauge_callback("darts_batcher_queue_depth", "Samples waiting for the rice_model batcher.",
+                       lambda: rice_batcher.stats()["queue_depth"])
+metrics.gauge_callback("darts_batcher_mean_batch_size", "Mean rice_model batch size since start.",
+                       lambda: rice_batcher.stats()["mean_batch_size"])
+metrics.counter_callback("darts_prediction_cache_events", "Prediction cache hits, misses and evictions.",
+                         lambda: {k: v for k, v in prediction_cache.stats().items()
+                                  if k in ("hits", "disk_hits", "misses", "evictions")}, labelname="event")
+metrics.gauge_callback("darts_prediction_cache_entries", "Predictions held in the in-memory cache.",
+                       lambda: prediction_cache.stats()["size"])
+metrics.gauge_callback("darts_job_queue_depth", "Upload jobs waiting for an inference worker.",
+                       lambda: upload_jobs.stats()["queue_depth"])
+metrics.counter_callback("darts_jobs", "Upload jobs submitted, rejected (429), done and failed.",
+                         lambda: {k: v for k, v in upload_jobs.stats().items()
+                                  if k in ("submitted", "rejected", "done", "failed")}, labelname="outcome")
+metrics.gauge_callback("darts_streams_active", "Open live scan streams.",
+                       lambda: stream_scheduler.stats()["active"])
+metrics.counter_callback("darts_stream_frames", "Live scan frames received and dropped (latest frame wins).",
+                         lambda: {k: v for k, v in stream_scheduler.stats().items() if k in ("frames", "dropped")},
+                         labelname="outcome")
+metrics.gauge_callback("darts_model_ready", "1 when the model is loaded and warmed up.",
+                       lambda: {name: int(info["state"] == "ready") for name, info in model_registry.status().items()},
+                       labelname="model")
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        request_latency.observe(time.perf_counter() - start, endpoint=request.endpoint or "unknown",
+                                method=request.method)
+    return response
+
+@app.errorhandler(UploadRejected)
+@app.errorhandler(RequestEntityTooLarge)
+def upload_rejected(error):
+    """Oversized, non-image or decompression-bomb uploads, refused before they are saved or decoded."""
+    reason = getattr(error, "reason", "too_large")
+    validation_rejections.inc(step=reason)
+    if reason == "too_large":
+        message = f"Upload is larger than {MAX_UPLOAD_MB:.0f} MB."
+    else:
+        message = error.description
+    # Only the upload form gets an HTML page; API and stream endpoints answer in JSON
+    if request.endpoint != 'index':
+        return jsonify({"error": message, "status": reason}), error.code
+    return render_result(**invalid_context(reason, image_url=None)), error.code
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/camera')
 def camera():
-    return render_template('camera.html')
+    return render_template(
+        'camera.html',
+        capture_min_side=CAMERA_UPLOAD_MIN_SIDE,
+        jpeg_quality=CAMERA_JPEG_QUALITY,
+        scan_quality=CAMERA_SCAN_QUALITY,
+        scan_interval_ms=CAMERA_SCAN_INTERVAL_MS
+    )
+
+def record_upload(nbytes):
+    """Counts upload bytes by the capture source the camera page reports (camera, file, scan)."""
+    source = request.form.get('source', 'unknown')
+    upload_bytes.observe(nbytes, source=source if source in UPLOAD_SOURCES else 'unknown')
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
@@ -80,118 +239,421 @@ def index():
 
         # Validate if it's an image
         if not file or not allowed_file(file.filename):
-            return render_template(
-                'result.html',
-                disease="Invalid Input",
-                confidence_score=0.0,
-                details={
-                    "Type": "N/A",
-                    "Symptoms": ["Invalid file type. Please upload a valid image."],
-                    "Causes": ["N/A"],
-                    "Management Strategies": ["Ensure the uploaded file is an image of rice or sugarcane disease."]
-                },
-                image_url=None
-            )
-
-        # Save the uploaded file
-        img_path = os.path.join('uploads', file.filename)
-        file.save(img_path)
-
-        # Step 1: Check if the image is black
-        if is_black_image(img_path):
-            return render_template(
-                'result.html',
-                disease="Invalid Input",
-                confidence_score=0.0,
-                details={
-                    "Type": "N/A",
-                    "Symptoms": ["Uploaded image is too dark or black. Please upload a clear image."],
-                    "Causes": ["N/A"],
-                    "Management Strategies": ["Ensure the image has enough light and clear details."]
-                },
-                image_url=f"/uploads/{file.filename}"
-            )
-
-        # Step 2: Validate if it's a rice or sugarcane
-        if not is_plant_image(img_path):
-            return render_template(
-                'result.html',
-                disease="Invalid Input",
-                confidence_score=0.0,
-                details={
-                    "Type": "N/A",
-                    "Symptoms": ["Uploaded image does not appear to be a plant leaf."],
-                    "Causes": ["N/A"],
-                    "Management Strategies": ["Please upload a clear image of rice or sugarcane leaves."]
-                },
-                image_url=f"/uploads/{file.filename}"
-            )
-
-        # Step 3: Predict Disease
-        prediction_result = predict_disease(img_path)
-
-        if prediction_result["predicted_disease"] == "Invalid Input":
-            return render_template(
-                'result.html',
-                disease="Invalid Input",
-                confidence_score=0.0,
-                details={
-                    "Type": "N/A",
-                    "Symptoms": ["The image does not match rice or sugarcane diseases."],
-                    "Causes": ["N/A"],
-                    "Management Strategies": ["Please upload a valid image of rice or sugarcane."]
-                },
-                image_url=f"/uploads/{file.filename}"
-            )
-
-        # Fetch disease details including the indicator
-        disease_details = disease_data.get(
-            prediction_result["predicted_disease"],
-            {
-                "Type": "Unknown",
-                "Symptoms": ["No information available"],
-                "Causes": ["No information available"],
-                "Management Strategies": ["No information available"],
-                "indicator": "green"  # Default indicator for unknown condition
-            }
-        )
-        indicator = disease_details.get("indicator", "green")
-
-        return render_template(
-            'result.html',
-            disease=prediction_result["predicted_disease"],
-            confidence_score=prediction_result["confidence_score"],
-            secondary_disease=prediction_result["secondary_disease"],
-            secondary_confidence_score=prediction_result["secondary_confidence_score"],
-            details=disease_details,
-            indicator=indicator,
-            image_url=f"/uploads/{file.filename}"
-        )
-    return render_template('main.html')
-
-def is_black_image(img_path, dark_threshold=15, black_ratio=0.98):
-    """Checks if the image is mostly black or too dark."""
-    try:
-        img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)  # Load in grayscale
-        if img is None:
-            return True  # Unreadable image is considered black
-
-        mean_intensity = np.mean(img)  # Compute average brightness
+            validation_rejections.inc(step="invalid_file")
+            return render_result(**invalid_context("invalid_file", image_url=None))
+
+        # mode=tiles scans the full-resolution upload tile by tile (camera page "high-resolution" toggle)
+        tiled = request.form.get('mode') == 'tiles'
+
+        # Read the upload once; identical uploads are answered from the prediction cache
+        data = file.read()
+        record_upload(len(data))
+
+        # Store the uploaded bytes (content-addressed) so the result page can display them
+        with stage_latency.time(stage="save"):
+            stored_name = upload_store.save(data, file.filename)
+        image_url = url_for('uploaded_file', filename=stored_name)
+
+        if ASYNC_UPLOADS:
+            try:
+                job_id = upload_jobs.submit((stored_name, tiled))
+            except QueueFull:
+                response = render_result(**invalid_context("busy", image_url, retry_after=JOB_RETRY_AFTER_SECONDS))
+                return response, 429, {"Retry-After": str(JOB_RETRY_AFTER_SECONDS)}
+            # Post/Redirect/Get: the result page shows the upload at once and fills in when the job finishes
+            return redirect(url_for('job_result', job_id=job_id), code=303)
+
+        analysis = analyze_upload(data, tiled=tiled)
+        record_rejection(analysis)
+        return render_result(**result_context(analysis, image_url))
+    if app.jinja_env.auto_reload:
+        return render_template('main.html')
+    # Same page for every visitor: rendered and gzip-compressed once
+    return static_pages.respond(("main", request.script_root), lambda: render_template('main.html'))
+
+def result_context(analysis, image_url):
+    """Template variables for result.html from an analyze_upload() record."""
+    # Step 1: Check if the image is black
+    if analysis["verdict"] in ("undecodable", "too_dark"):
+        return invalid_context("too_dark", image_url)
+
+    # Step 2: Validate if it's a rice or sugarcane
+    if analysis["verdict"] == "not_plant":
+        return invalid_context("not_plant", image_url)
+
+    # Step 3: Predict Disease
+    prediction_result = analysis["prediction"]
+
+    if prediction_result["predicted_disease"] == "Invalid Input":
+        return invalid_context("low_confidence", image_url)
+
+    # Precomputed catalog record: details, severity indicator and detail HTML
+    label = lookup(prediction_result["predicted_disease"])
+
+    return dict(
+        disease=prediction_result["predicted_disease"],
+        confidence_score=prediction_result["confidence_score"],
+        confidence_percent=f"{prediction_result['confidence_score'] * 100:.1f}",
+        secondary_disease=prediction_result["secondary_disease"],
+        secondary_confidence_score=prediction_result["secondary_confidence_score"],
+        details=label.details,
+        details_html=label.details_html,
+        indicator=label.indicator,
+        image_url=image_url,
+        tiles=analysis.get("tiles"),
+        heatmap=heatmap_cells(analysis.get("tiles"), prediction_result["predicted_disease"])
+    )
 
-        # Count pixels below the dark threshold
-        dark_pixels = np.sum(img < dark_threshold)
-        total_pixels = img.size
-        dark_ratio = dark_pixels / total_pixels  # Percentage of dark pixels
+def heatmap_cells(tiles, disease):
+    """Cells of a tiled scan's heatmap for one disease, positioned in percent of the image, for result.html."""
+    if not tiles or disease not in tiles["heatmap"]:
+        return None
+    width, height = tiles["image_size"]
+    cell = tiles["cell_px"]
+    cells = []
+    for row, values in enumerate(tiles["heatmap"][disease]):
+        for col, value in enumerate(values):
+            if value is None:
+                continue
+            cells.append({
+                "left": col * cell / width * 100,
+                "top": row * cell / height * 100,
+                "width": min(cell, width - col * cell) / width * 100,
+                "height": min(cell, height - row * cell) / height * 100,
+                "value": value
+            })
+    return cells
+
+def invalid_context(reason, image_url, retry_after=None):
+    """Template variables for the "Invalid Input" result of a rejection reason (see INVALID_DETAILS).
+
+    retry_after (seconds) is shown on pages sent with a Retry-After header.
+    """
+    return dict(
+        disease="Invalid Input",
+        reason=reason,
+        confidence_score=0.0,
+        details=INVALID_DETAILS[reason],
+        image_url=image_url,
+        retry_after=retry_after
+    )
 
-        # Consider image black if more than 98% of pixels are below the dark threshold
-        return dark_ratio > black_ratio
-    except Exception as e:
-        print(f"Error checking black image: {e}")
-        return True  # Fail-safe: Assume black if error occurs
+def record_rejection(analysis):
+    """Counts a rejected upload under the validation step that rejected it."""
+    if analysis["verdict"] != "ok":
+        validation_rejections.inc(step=analysis["verdict"])
+    elif analysis["prediction"]["predicted_disease"] == "Invalid Input":
+        validation_rejections.inc(step="low_confidence")
+
+# result.html rendered once per page shape; requests only splice in these fields
+result_pages = TemplateCache(
+    lambda **context: render_template('result.html', **context),
+    fields=("image_url", "confidence_percent", "job_id"),
+    name="result_pages"
+)
+
+def result_page_key(context):
+    """Cache key of a result page's shape, or None for pages that must be fully rendered."""
+    if app.jinja_env.auto_reload or context.get("heatmap"):
+        return None
+    if context.get("pending"):
+        shape = ("pending",)
+    elif context["disease"] == "Invalid Input":
+        shape = ("invalid", context["reason"], context.get("retry_after"))
+    else:
+        shape = ("label", context["disease"])
+    return (request.script_root,) + shape
+
+def render_result(**context):
+    """Renders result.html, timed as the "render_template" stage."""
+    with stage_latency.time(stage="render_template"):
+        key = result_page_key(context)
+        if key is None:
+            return render_template('result.html', **context)
+        return result_pages.render(key, context)
+
+def top_k_predictions(predictions, k):
+    """Returns the k most likely disease labels with their confidences."""
+    indices = predictions.argsort()[::-1][:k]
+    return [
+        {"label": label_name(int(i)), "confidence": float(predictions[i])}
+        for i in indices
+    ]
+
+def api_result(analysis, top_k):
+    """Formats a cached/computed analysis record for the JSON API."""
+    if analysis["verdict"] != "ok":
+        return {"status": analysis["verdict"]}
+    result = dict(analysis["prediction"])
+    result["status"] = "low_confidence" if result["predicted_disease"] == "Invalid Input" else "ok"
+    result["top_k"] = top_k_predictions(np.asarray(analysis["probabilities"]), top_k)
+    if "tiles" in analysis:
+        result["tiles"] = analysis["tiles"]
+    return result
+
+def requested_top_k():
+    """The ?top_k= query parameter clamped to the number of classes, or None if malformed."""
+    try:
+        return max(1, min(int(request.args.get('top_k', 3)), len(LABELS)))
+    except ValueError:
+        return None
+
+def read_api_images():
+    """Collects (name, bytes) pairs from multipart files or a JSON body of base64 strings.
+
+    A multipart file that is not a JPEG/PNG comes back as (name, UploadRejected)
+    so it can be reported per item, like an undecodable base64 entry.
+    """
+    request.reject_parts_individually = True
+    if request.files:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        return [(f.filename, part_rejection(f) or f.read()) for f in files]
+
+    payload = request.get_json(silent=True) or {}
+    encoded = payload.get('images') or ([payload['image']] if payload.get('image') else [])
+    images = []
+    for i, item in enumerate(encoded):
+        name = f"image_{i}"
+        if isinstance(item, dict):
+            name = item.get('filename', name)
+            item = item.get('data', '')
+        if isinstance(item, str) and item.startswith('data:'):
+            item = item.split(',', 1)[-1]  # Strip data URL prefix
+        try:
+            images.append((name, base64.b64decode(item)))
+        except (binascii.Error, TypeError, ValueError):
+            images.append((name, b''))
+    return images
+
+@app.route('/api/v1/predict', methods=['POST'])
+def api_predict():
+    """JSON prediction API: one or many images per call, one batched CNN forward pass.
+
+    ?mode=tiles scans each image tile by tile instead and adds a "tiles"
+    summary (lesion tile counts and per-class heatmaps) to its result.
+    """
+    images = read_api_images()
+    if not images:
+        return jsonify({"error": "No images provided. Send multipart 'file'/'files' or JSON 'images' (base64)."}), 400
+    if len(images) > API_MAX_IMAGES:
+        return jsonify({"error": f"Too many images; at most {API_MAX_IMAGES} per request."}), 413
+    top_k = requested_top_k()
+    if top_k is None:
+        return jsonify({"error": "top_k must be an integer."}), 400
+    tiled = request.args.get('mode') == 'tiles'
+
+    results = []
+    pending = []
+    for name, data in images:
+        result = {"filename": name}
+        results.append(result)
+        if isinstance(data, UploadRejected):
+            validation_rejections.inc(step=data.reason)
+            result.update(status=data.reason, error=data.description)
+            continue
+        record_upload(len(data))
+        if tiled:
+            # A tiled scan already classifies its leaf tiles in large batches of its own
+            analysis = analyze_upload(data, tiled=True)
+            result.update(api_result(analysis, top_k))
+            record_rejection(analysis)
+            continue
+        key = prediction_cache.key(data)
+        analysis = prediction_cache.get(key)
+        if analysis is None:
+            analysis, decoded = validate_upload(data)
+            if analysis is None:
+                pending.append((result, key, decoded))
+                continue
+            prediction_cache.put(key, analysis)
+        result.update(api_result(analysis, top_k))
+        record_rejection(analysis)
+
+    if pending:
+        try:
+            predictions, views = predict_probabilities_batch([decoded for _, _, decoded in pending])
+        except Exception as e:
+            print(f"Error during API prediction: {e}")
+            return jsonify({"error": "Model unavailable, try again shortly."}), 503
+        for row, (result, key, _) in enumerate(pending):
+            analysis = prediction_analysis(predictions[row])
+            if views == tta_budget.max_views:
+                prediction_cache.put(key, analysis)
+            result.update(api_result(analysis, top_k))
+            record_rejection(analysis)
+
+    return jsonify({"model_version": CNN_MODEL_VERSION, "results": results})
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queues one multipart 'file' upload for background analysis; poll the returned status_url."""
+    file = request.files.get('file')
+    if not file or not allowed_file(file.filename):
+        return jsonify({"error": "Send one image as multipart 'file'."}), 400
+    stored_name = upload_store.save(file.read(), file.filename)
+    try:
+        job_id = upload_jobs.submit((stored_name, request.form.get('mode') == 'tiles'))
+    except QueueFull:
+        return (jsonify({"error": "Too many pending jobs, retry shortly."}), 429,
+                {"Retry-After": str(JOB_RETRY_AFTER_SECONDS)})
+    status_url = url_for('job_status', job_id=job_id)
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": status_url,
+        "result_url": url_for('job_result', job_id=job_id)
+    }), 202, {"Location": status_url}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job state as JSON; ?wait=<seconds> long-polls until the job finishes (capped at JOB_MAX_WAIT_SECONDS)."""
+    top_k = requested_top_k()
+    try:
+        wait = max(0.0, min(float(request.args.get('wait', 0)), JOB_MAX_WAIT_SECONDS))
+    except ValueError:
+        top_k = None
+    if top_k is None:
+        return jsonify({"error": "wait must be a number and top_k an integer."}), 400
+
+    job = upload_jobs.get(job_id, wait=wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    body = {"job_id": job_id, "status": job["status"], "model_version": CNN_MODEL_VERSION}
+    if job["status"] == "done":
+        body["result"] = api_result(job["result"], top_k)
+    elif job["status"] == "failed":
+        body["error"] = job["error"]
+    return jsonify(body)
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """result.html for a job: a pending page that polls job_status until the analysis is ready."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        abort(404)
+    image_url = url_for('uploaded_file', filename=job["payload"][0])
+    if job["status"] == "failed":
+        return render_result(**invalid_context("failed", image_url))
+    if job["status"] != "done":
+        return render_result(disease=None, pending=True, job_id=job_id, image_url=image_url)
+    return render_result(**result_context(job["result"], image_url))
+
+@app.route('/jobs/stats')
+def job_stats():
+    return jsonify(upload_jobs.stats())
+
+@app.route('/api/v1/stream', methods=['POST'])
+def open_stream():
+    """Opens a live scan stream; post frames to frames_url and read the smoothed result from each reply."""
+    try:
+        stream_id = stream_scheduler.open()
+    except StreamLimitReached:
+        return (jsonify({"error": "Too many live streams, retry shortly."}), 429,
+                {"Retry-After": str(JOB_RETRY_AFTER_SECONDS)})
+    return jsonify({
+        "stream_id": stream_id,
+        "stream_url": url_for('stream_status', stream_id=stream_id),
+        "frames_url": url_for('stream_frames', stream_id=stream_id)
+    }), 201
+
+@app.route('/api/v1/stream/<stream_id>/frames', methods=['POST'])
+def stream_frames(stream_id):
+    """Takes one frame (raw image/jpeg body or multipart 'file') and replies at once with the smoothed result so far."""
+    if (request.content_length or 0) > STREAM_MAX_FRAME_BYTES:
+        return jsonify({"error": f"Frames are limited to {STREAM_MAX_FRAME_BYTES // 1024} KB."}), 413
+    file = request.files.get('file')
+    data = file.read() if file else request.get_data()
+    if not data:
+        return jsonify({"error": "Send the frame as the request body or multipart 'file'."}), 400
+    check_image_header(data[:HEADER_PROBE_BYTES])
+    upload_bytes.observe(len(data), source="stream")
+
+    snapshot = stream_scheduler.push(stream_id, data)
+    if snapshot is None:
+        return jsonify({"error": "Unknown or expired stream."}), 404
+    return jsonify(stream_result(snapshot))
+
+@app.route('/api/v1/stream/<stream_id>', methods=['GET', 'DELETE'])
+def stream_status(stream_id):
+    if request.method == 'DELETE':
+        return ('', 204) if stream_scheduler.close(stream_id) else (jsonify({"error": "Unknown stream."}), 404)
+    snapshot = stream_scheduler.snapshot(stream_id)
+    if snapshot is None:
+        return jsonify({"error": "Unknown or expired stream."}), 404
+    return jsonify(stream_result(snapshot))
+
+def stream_result(snapshot):
+    """Adds the smoothed label to a stream snapshot.
+
+    status is "low_confidence" when the smoothed scores are inconclusive,
+    otherwise the latest frame's status ("ok", "too_dark", "not_plant", ...,
+    or "waiting" before the first frame is classified).
+    """
+    probabilities = snapshot.pop("probabilities")
+    if probabilities is None:
+        snapshot["status"] = snapshot["frame_status"]
+        return snapshot
+    prediction = interpret_predictions(np.asarray(probabilities))
+    snapshot.update(prediction)
+    if prediction["predicted_disease"] == "Invalid Input":
+        snapshot["status"] = "low_confidence"
+    else:
+        snapshot["status"] = snapshot["frame_status"]
+    return snapshot
+
+@app.route('/stream/stats')
+def stream_stats():
+    return jsonify(stream_scheduler.stats())
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: required models are loaded and warmed up."""
+    ready = model_registry.is_ready()
+    body = {"status": "ready" if ready else "loading", "models": model_registry.status()}
+    return jsonify(body), (200 if ready else 503)
+
+@app.route('/batching/stats')
+def batching_stats():
+    return jsonify(rice_batcher.stats())
+
+@app.route('/tta/stats')
+def tta_stats():
+    return jsonify(tta_budget.stats())
+
+@app.route('/render/stats')
+def render_stats():
+    return jsonify(result_pages.stats())
+
+@app.route('/storage/stats')
+def upload_stats():
+    return jsonify(upload_store.stats())
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/validation/stats')
+def validation_stats():
+    return jsonify(plant_validator.stats())
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    return assets.send(filename)
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory('uploads', filename)
+    location = upload_store.locate(filename)
+    if location is None:
+        abort(404)
+    # Names are content hashes, so the bytes behind a URL never change
+    response = send_from_directory(*location, max_age=UPLOAD_CACHE_SECONDS)
+    response.headers['Cache-Control'] = f"private, max-age={UPLOAD_CACHE_SECONDS}, immutable"
+    return response
 
 def invalid_input_response(message):
     """Returns a response for invalid input."""
@@ -208,115 +670,11 @@ def invalid_input_response(message):
         image_url=None
     )
 
-def is_plant_image(img_path):
-    """Checks if an image is a plant using MobileNetV2."""
-    try:
-        img = image.load_img(img_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-
-        predictions = plant_model.predict(img_array, verbose=0)
-        top_prediction = np.argmax(predictions)
-
-        # ImageNet categories for plants (broad range)
-        # Categories 0-999 include many plant-related classes
-        # We'll be more permissive to avoid false negatives
-        plant_categories = list(range(0, 1000))  # Accept most ImageNet categories
-        
-        # Additional check: if the image has significant green content, consider it a plant
-        img_cv = cv2.imread(img_path)
-        if img_cv is not None:
-            img_hsv = cv2.cvtColor(img_cv, cv2.COLOR_BGR2HSV)
-            lower_green = np.array([25, 30, 10])
-            upper_green = np.array([100, 255, 255])
-            mask = cv2.inRange(img_hsv, lower_green, upper_green)
-            green_percentage = (cv2.countNonZero(mask) / mask.size) * 100
-            
-            # If more than 20% is green, consider it a plant
-            if green_percentage > 20:
-                return True
-
-        return top_prediction in plant_categories
-    except Exception as e:
-        print(f"Error during plant validation: {e}")
-        return False
-
-def is_rice_or_sugarcane(img_path):
-    """Verifies if the leaf is rice or sugarcane using improved color analysis."""
-    try:
-        img = cv2.imread(img_path)
-        if img is None:
-            return False
-            
-        img_hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-
-        # Define an expanded green color range for plant leaves
-        lower_green = np.array([25, 30, 10])  # Allow for more shades
-        upper_green = np.array([100, 255, 255])  # Include slightly yellow-green shades
-
-        mask = cv2.inRange(img_hsv, lower_green, upper_green)
-        green_percentage = (cv2.countNonZero(mask) / mask.size) * 100
-
-        # More permissive threshold for plant detection
-        return green_percentage > 15  # Lowered threshold to be more inclusive
-    except Exception as e:
-        print(f"Error during rice/sugarcane validation: {e}")
-        return False
-
-def predict_disease(img_path):
-    """Runs CNN model to classify disease and validates confidence levels."""
-    try:
-        # Preprocess the image
-        img = image.load_img(img_path, target_size=(224, 224))
-        img_array = image.img_to_array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
-
-        # Predict disease using the model
-        predictions = rice_model.predict(img_array, verbose=0)[0]
-
-        # Sort predictions and get the top two indices
-        top_two_indices = predictions.argsort()[-2:][::-1]
-        primary_index = top_two_indices[0]
-        secondary_index = top_two_indices[1]
-
-        # Get confidence scores for top two predictions
-        primary_confidence = float(predictions[primary_index])
-        secondary_confidence = float(predictions[secondary_index])
-
-        # Validate prediction: If confidence is too low, return "Invalid Input"
-        if primary_confidence < 0.30 or primary_index not in disease_mapping:  # Lowered threshold
-            return {
-                "predicted_disease": "Invalid Input",
-                "confidence_score": 0.0,
-                "secondary_disease": None,
-                "secondary_confidence_score": 0.0
-            }
-
-        return {
-            "predicted_disease": disease_mapping[primary_index],
-            "confidence_score": primary_confidence,
-            "secondary_disease": disease_mapping.get(secondary_index, "Unknown"),
-            "secondary_confidence_score": secondary_confidence
-        }
-    except Exception as e:
-        print(f"Error during prediction: {e}")
-        return {
-            "predicted_disease": "Invalid Input",
-            "confidence_score": 0.0,
-            "secondary_disease": None,
-            "secondary_confidence_score": 0.0
-        }
-
-def allowed_file(filename):
-    """Checks if the uploaded file is an allowed image type."""
-    allowed_extensions = {"png", "jpg", "jpeg"}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
-
 @app.route('/')
 def home():
     return "Flask Server is Running!"
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    # Production serving (waitress, worker processes, graceful shutdown) lives in serve.py
+    import serve
+    sys.exit(serve.main())
@@ -0,0 +1,183 @@
+# Offline batch classification CLI for DARTS system
+#
+# Usage:
+#   python batch_classify.py SURVEY_DIR -o results.csv
+#   python batch_classify.py SURVEY_DIR -o results.jsonl --workers 4 --batch-size 32 --resume
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+# Workers load their own model copy; the parent process never needs TensorFlow
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+
+RESULT_FIELDS = [
+    "path",
+    "status",
+    "predicted_disease",
+    "confidence_score",
+    "secondary_disease",
+    "secondary_confidence_score",
+]
+
+
+def find_images(input_dir):
+    """Yields image paths (relative to input_dir) in a stable order."""
+    from engine import allowed_file
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if allowed_file(name):
+                yield os.path.relpath(os.path.join(root, name), input_dir)
+
+
+def truncate_partial_line(output_path):
+    """Cuts off a last line left unterminated by an interrupted run, so new rows start on a clean line."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+            print("⚠️  Dropped a partially written last row from the previous run")
+
+
+def is_complete_row(row):
+    """True if every result column was written and a classified row carries a parseable confidence."""
+    if not isinstance(row, dict) or None in row or any(field not in row for field in RESULT_FIELDS):
+        return False
+    if not row["path"] or not row["status"]:
+        return False
+    if row["status"] in ("ok", "invalid"):
+        if not row["predicted_disease"]:
+            return False
+        try:
+            float(row["confidence_score"])
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+def load_done_paths(output_path, output_format):
+    """Reads an existing output file and returns the set of paths already classified.
+
+    Rows that are incomplete or do not parse are not counted, so --resume redoes those images.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, newline='', encoding='utf-8') as f:
+        if output_format == 'csv':
+            # Short rows get None for the missing columns, long ones an extra None key
+            rows = csv.DictReader(f)
+        else:
+            rows = []
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue
+        for row in rows:
+            if is_complete_row(row):
+                done.add(row["path"])
+    return done
+
+
+def init_worker(input_dir):
+    """Pool initializer: loads one model instance per worker process."""
+    global _INPUT_DIR
+    _INPUT_DIR = input_dir
+    import engine
+    engine.model_registry.warm_up(names=["rice_model"], background=False)
+
+
+def classify_chunk(rel_paths):
+    """Validates a chunk of images and classifies the valid ones in one batched forward pass."""
+    import engine
+    from image_loader import DecodedImage
+
+    results = []
+    pending = []
+    for rel_path in rel_paths:
+        row = dict.fromkeys(RESULT_FIELDS)
+        row["path"] = rel_path
+        results.append(row)
+        try:
+            decoded = DecodedImage.from_path(os.path.join(_INPUT_DIR, rel_path))
+            if decoded is None:
+                row["status"] = "unreadable"
+            elif engine.is_black_image(decoded):
+                row["status"] = "too_dark"
+            elif not engine.is_plant_image(decoded):
+                row["status"] = "not_plant"
+            else:
+                pending.append((row, decoded))
+        except Exception as e:
+            row["status"] = f"error: {e}"
+
+    if pending:
+        predictions = engine.predict_disease_batch([decoded for _, decoded in pending])
+        for (row, _), prediction in zip(pending, predictions):
+            row.update(prediction)
+            row["status"] = "invalid" if prediction["predicted_disease"] == "Invalid Input" else "ok"
+    return results
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a directory of rice/sugarcane leaf images.")
+    parser.add_argument("input_dir", help="Directory to scan recursively for .png/.jpg/.jpeg images")
+    parser.add_argument("-o", "--output", default="results.csv", help="Output file (.csv or .jsonl)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Output format (default: from extension)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Worker processes, each with its own model copy")
+    parser.add_argument("--batch-size", type=int, default=16, help="Images per CNN forward pass")
+    parser.add_argument("--resume", action="store_true", help="Skip images already present in the output file")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('jsonl' if args.output.endswith(('.jsonl', '.json')) else 'csv')
+
+    images = list(find_images(args.input_dir))
+    if args.resume:
+        truncate_partial_line(args.output)
+    done = load_done_paths(args.output, output_format) if args.resume else set()
+    todo = [path for path in images if path not in done]
+    print(f"Found {len(images)} images, {len(done)} already done, {len(todo)} to classify")
+    if not todo:
+        return 0
+
+    append = args.resume and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+
+    processed = 0
+    start = time.perf_counter()
+    with open(args.output, 'a' if append else 'w', newline='', encoding='utf-8') as out:
+        writer = csv.DictWriter(out, fieldnames=RESULT_FIELDS) if output_format == 'csv' else None
+        if writer is not None and not append:
+            writer.writeheader()
+
+        with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.input_dir,)) as pool:
+            for results in pool.imap_unordered(classify_chunk, chunked(todo, args.batch_size)):
+                for row in results:
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        out.write(json.dumps(row) + "\n")
+                out.flush()  # Write incrementally so an interrupted run can --resume
+                processed += len(results)
+                print(f"\r{processed}/{len(todo)} images", end="", flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Classified {processed} images in {elapsed:.1f}s ({processed / elapsed:.2f} images/s)")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# Dynamic micro-batching for DARTS model inference
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Collects samples from concurrent callers and runs them through one forward pass.
+
+    The worker thread waits for the first pending sample, then keeps gathering
+    until either ``max_batch_size`` samples are queued or ``max_wait_ms`` has
+    elapsed. Each caller gets back its own row of the batched output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = {}
+
+    def submit(self, sample):
+        """Queues a single (unbatched) sample and returns a Future for its output row."""
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((np.asarray(sample), future))
+        depth = self._queue.qsize()
+        with self._lock:
+            if depth > self._max_queue_depth:
+                self._max_queue_depth = depth
+        return future
+
+    def predict(self, sample, timeout=None):
+        """Blocking helper: submits a sample and waits for its prediction row."""
+        return self.submit(sample).result(timeout=timeout)
+
+    def stats(self):
+        """Returns queue-depth and batch-size counters for tuning."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "items": self._items,
+                "errors": self._errors,
+                "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Still drain anything that is already waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [future for _, future in batch]
+            try:
+                outputs = self.predict_fn(np.stack([sample for sample, _ in batch]))
+                for i, future in enumerate(futures):
+                    future.set_result(outputs[i])
+            except Exception as e:
+                with self._lock:
+                    self._errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
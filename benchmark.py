@@ -0,0 +1,220 @@
+# Benchmark harness for DARTS system
+#
+# Measures per-stage latency, end-to-end latency through the Flask test client
+# and throughput at several concurrency levels on synthetic leaf images.
+# Results are written as JSON so runs from different commits can be compared.
+#
+# Usage:
+#   python benchmark.py --output bench.json
+#   python benchmark.py --stub-model --resolutions 640x480 4000x3000 --concurrency 1 4 8
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+
+# Keep benchmark uploads out of the real upload store and load models on demand
+os.environ.setdefault('UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'darts-bench-uploads'))
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+# Time the full pipeline inside the POST rather than the async job hand-off
+os.environ.setdefault('ASYNC_UPLOADS', '0')
+
+
+class StubModel:
+    """Deterministic stand-in for a Keras model when the real weights are unavailable."""
+
+    def __init__(self, num_classes, seed=0):
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((3 * 16 * 16, num_classes)).astype(np.float32)
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        features = np.stack([cv2.resize(sample, (16, 16), interpolation=cv2.INTER_AREA).ravel() for sample in batch])
+        logits = features @ self.projection
+        logits -= logits.max(axis=1, keepdims=True)
+        scores = np.exp(logits)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+
+def synthetic_leaf(width, height, seed=0):
+    """Draws a leaf-like image: a green blade with brown lesions on a soil background."""
+    rng = np.random.default_rng(seed)
+    img = np.empty((height, width, 3), dtype=np.uint8)
+    img[:] = (40, 70, 100)  # BGR soil
+    img = cv2.add(img, rng.integers(0, 30, img.shape, dtype=np.uint8))
+    center = (width // 2, height // 2)
+    axes = (int(width * 0.45), int(height * 0.18))
+    cv2.ellipse(img, center, axes, -20, 0, 360, (40, 150, 60), -1)
+    for _ in range(25):
+        x = int(rng.integers(width * 0.15, width * 0.85))
+        y = int(rng.integers(height * 0.35, height * 0.65))
+        r = int(rng.integers(max(2, width // 200), max(3, width // 60)))
+        cv2.circle(img, (x, y), r, (30, 60, 120), -1)
+    ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {
+        "n": int(samples.size),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "min_ms": float(samples.min()),
+    }
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return summarize(times)
+
+
+def bench_stages(app_module, data, repeat):
+    """Times each pipeline stage in isolation on the same upload."""
+    from flask import render_template
+    import engine
+    from image_loader import DecodedImage
+
+    decoded = DecodedImage.from_bytes(data)
+    # Same pixels, empty gray/HSV/resize caches: times a stage without its decode
+    fresh_caches = lambda: DecodedImage(decoded.bgr)
+    result = engine.predict_disease(decoded)
+    context = app_module.result_context({"verdict": "ok", "prediction": result}, "/uploads/x.jpg")
+
+    def render():
+        with app_module.app.test_request_context('/'):
+            render_template('result.html', **context)
+
+    return {
+        "decode": timed(lambda: DecodedImage.from_bytes(data), repeat),
+        "is_black_image": timed(lambda: engine.is_black_image(fresh_caches()), repeat),
+        "is_plant_image": timed(lambda: engine.is_plant_image(fresh_caches()), repeat),
+        # Includes the micro-batcher's wait for company (BATCH_MAX_WAIT_MS) when running alone
+        "predict_disease": timed(lambda: engine.predict_disease(fresh_caches()), repeat),
+        "render_template": timed(render, repeat),
+    }
+
+
+def post_upload(client, data, name='leaf.jpg'):
+    response = client.post('/', data={'file': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+    assert response.status_code == 200, response.status_code
+
+
+def bench_end_to_end(app_module, data, repeat):
+    client = app_module.app.test_client()
+    return timed(lambda: post_upload(client, data), repeat)
+
+
+def bench_throughput(app_module, data, concurrency, requests_per_worker):
+    """Requests/second with `concurrency` clients posting simultaneously."""
+    def worker():
+        client = app_module.app.test_client()
+        for _ in range(requests_per_worker):
+            post_upload(client, data)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    total = concurrency * requests_per_worker
+    return {"concurrency": concurrency, "requests": total, "seconds": elapsed, "requests_per_second": total / elapsed}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def install_stub_models(engine):
+    engine.model_registry.register("rice_model", lambda: StubModel(len(engine.LABELS)))
+    engine.model_registry.register("plant_model", lambda: StubModel(1000, seed=1), required=False)
+
+
+def main(argv=None):
+    # App diagnostics go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        report, output_path = run(argv)
+
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"✅ Results written to {output_path}", file=sys.stderr)
+    else:
+        print(output)
+    return 0
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the DARTS request path and its stages.")
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    parser.add_argument("--repeat", type=int, default=20, help="Iterations per stage / end-to-end measurement")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests-per-worker", type=int, default=10)
+    parser.add_argument("--stub-model", action="store_true", help="Use a stub model even if the real one exists")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the prediction cache enabled")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    import engine
+
+    stubbed = args.stub_model or not os.path.exists(engine.INFERENCE_MODEL_PATH)
+    if stubbed:
+        print("ℹ️  Using stub models (real model absent or --stub-model given)", file=sys.stderr)
+        install_stub_models(engine)
+    engine.model_registry.warm_up(background=False)
+    if not args.with_cache:
+        engine.prediction_cache.max_entries = 0  # Every request must run the full pipeline
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": engine.INFERENCE_BACKEND,
+            "stub_model": stubbed,
+            "cache_enabled": args.with_cache,
+            "repeat": args.repeat,
+        },
+        "resolutions": {},
+    }
+
+    for resolution in args.resolutions:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        data = synthetic_leaf(width, height)
+        print(f"Benchmarking {resolution} ({len(data) / 1024:.0f} KB JPEG)...", file=sys.stderr)
+        report["resolutions"][resolution] = {
+            "upload_bytes": len(data),
+            "stages": bench_stages(app_module, data, args.repeat),
+            "end_to_end": bench_end_to_end(app_module, data, args.repeat),
+            "throughput": [bench_throughput(app_module, data, c, args.requests_per_worker)
+                           for c in args.concurrency],
+        }
+
+    return report, args.output
+
+
+if __name__ == "__main__":
+    sys.exit(main())
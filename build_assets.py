@@ -0,0 +1,147 @@
+# Static asset build for DARTS system
+#
+# Generates resized AVIF/WebP/JPEG variants of the images in static/assets,
+# names every output after a hash of its contents, and writes
+# static/build/manifest.json for static_assets.py. Templates then emit
+# srcset/image-set references to the fingerprinted files, which are served
+# with immutable cache headers. Text assets also get a precompressed .gz.
+#
+# Usage:
+#   python build_assets.py            # before starting serve.py (see render.yaml)
+#   python build_assets.py --clean    # drop old fingerprinted files first
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+
+from PIL import Image, features
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+SOURCE_DIR = "assets"
+BUILD_DIR = "build"
+MANIFEST_NAME = "manifest.json"
+
+# Candidate widths; each image gets those below its own width plus its own width
+WIDTHS = (80, 160, 320, 640, 960, 1280, 1920, 2560)
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg"}
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt"}
+
+AVIF_QUALITY = 50
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def write_fingerprinted(build_root, stem, ext, data):
+    """Writes data as build/<stem>.<hash><ext> and returns its path relative to static/."""
+    name = f"{stem}.{fingerprint(data)}{ext}"
+    with open(os.path.join(build_root, name), "wb") as f:
+        f.write(data)
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        with open(os.path.join(build_root, name + ".gz"), "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    return f"{BUILD_DIR}/{name}"
+
+
+def encode(image, mimetype):
+    buffer = io.BytesIO()
+    if mimetype == "image/avif":
+        image.save(buffer, "AVIF", quality=AVIF_QUALITY)
+    elif mimetype == "image/webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    elif mimetype == "image/jpeg":
+        image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def variant_widths(width):
+    return [w for w in WIDTHS if w < width] + [min(width, WIDTHS[-1])]
+
+
+def build_image(path, relative, build_root, formats):
+    """Builds the variants of one raster image; returns its manifest entry."""
+    with open(path, "rb") as f:
+        original = f.read()
+    stem, ext = os.path.splitext(os.path.basename(relative))
+    stem = stem.replace(" ", "_")
+    image = Image.open(io.BytesIO(original))
+    image.load()
+    has_alpha = image.mode in ("RGBA", "LA", "PA") and image.getextrema()[-1][0] < 255
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    # Opaque images fall back to JPEG; transparent ones keep PNG
+    fallback = "image/png" if has_alpha else "image/jpeg"
+
+    entry = {
+        "original": write_fingerprinted(build_root, stem, ext.lower(), original),
+        "width": image.width,
+        "height": image.height,
+        "fallback": fallback,
+        "variants": {},
+    }
+    for width in variant_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for mimetype in formats + [fallback]:
+            data = encode(resized, mimetype)
+            ext_out = "." + mimetype.split("/")[1].replace("jpeg", "jpg")
+            entry["variants"].setdefault(mimetype, []).append(
+                [width, write_fingerprinted(build_root, f"{stem}-{width}w", ext_out, data)])
+    return entry
+
+
+def build(static_dir=STATIC_DIR, clean=False):
+    build_root = os.path.join(static_dir, BUILD_DIR)
+    if clean and os.path.isdir(build_root):
+        shutil.rmtree(build_root)
+    os.makedirs(build_root, exist_ok=True)
+
+    formats = ["image/webp"]
+    if features.check("avif"):
+        formats.insert(0, "image/avif")
+    else:
+        print("⚠️  Pillow was built without AVIF support; generating WebP and JPEG/PNG only")
+
+    manifest = {}
+    source_root = os.path.join(static_dir, SOURCE_DIR)
+    for dirpath, _, filenames in os.walk(source_root):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in RASTER_EXTENSIONS:
+                manifest[relative] = build_image(path, relative, build_root, formats)
+            else:
+                with open(path, "rb") as f:
+                    stem = os.path.splitext(filename)[0].replace(" ", "_")
+                    manifest[relative] = {"original": write_fingerprinted(build_root, stem, ext, f.read())}
+            built = sum(os.path.getsize(os.path.join(static_dir, p))
+                        for variants in manifest[relative].get("variants", {}).values() for _, p in variants)
+            print(f"✅ {relative}: {os.path.getsize(path) / 1e3:.0f} KB -> "
+                  f"{len(manifest[relative].get('variants', {}))} formats, {built / 1e3:.0f} KB of variants")
+
+    with open(os.path.join(build_root, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted, responsive DARTS static assets.")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    parser.add_argument("--clean", action="store_true", help="Remove previously built files first")
+    args = parser.parse_args(argv)
+    manifest = build(args.static_dir, clean=args.clean)
+    print(f"📦 Wrote {len(manifest)} assets to {os.path.join(args.static_dir, BUILD_DIR)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Model export utility for DARTS system
+#
+# Converts the Keras disease CNN to TFLite or ONNX (optionally float16/int8
+# quantized) and checks that the export agrees with the Keras model.
+#
+# Usage:
+#   python convert_model.py --format tflite --quantize float16 --sample-dir path/to/leaves
+#   python convert_model.py --format onnx --quantize int8
+#
+# Then serve it with INFERENCE_BACKEND=tflite (or onnx).
+import argparse
+import os
+import sys
+
+import numpy as np
+
+os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+
+
+def load_samples(sample_dir, limit):
+    """Preprocesses up to `limit` images exactly like predict_disease; synthetic noise if none are given."""
+    from engine import allowed_file, preprocess_for_cnn
+    from image_loader import DecodedImage
+
+    samples = []
+    if sample_dir:
+        for root, _, files in os.walk(sample_dir):
+            for name in sorted(files):
+                if len(samples) >= limit:
+                    break
+                if allowed_file(name):
+                    decoded = DecodedImage.from_path(os.path.join(root, name))
+                    if decoded is not None:
+                        samples.append(preprocess_for_cnn(decoded))
+    if not samples:
+        print("⚠️  No sample images found; using synthetic inputs (parity numbers will be less meaningful)")
+        rng = np.random.default_rng(0)
+        samples = list(rng.random((min(limit, 32), 224, 224, 3), dtype=np.float32))
+    return np.stack(samples)
+
+
+def convert_tflite(model, output_path, quantize, samples):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in samples)
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def convert_onnx(model, output_path, quantize):
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = (tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input"),)
+    float_path = output_path if quantize == "none" else output_path + ".fp32"
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=float_path)
+
+    if quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QUInt8)
+    elif quantize == "float16":
+        import onnx
+        from onnxconverter_common import float16
+        onnx.save(float16.convert_float_to_float16(onnx.load(float_path), keep_io_types=True), output_path)
+    if float_path != output_path:
+        os.remove(float_path)
+
+
+def check_parity(reference, candidate, samples, batch_size=16):
+    """Compares two models on the same inputs: top-1 agreement and probability differences."""
+    expected = np.concatenate([reference.predict(samples[i:i + batch_size], verbose=0)
+                               for i in range(0, len(samples), batch_size)])
+    actual = np.concatenate([candidate.predict(samples[i:i + batch_size], verbose=0)
+                             for i in range(0, len(samples), batch_size)])
+    diff = np.abs(expected - actual)
+    return {
+        "samples": len(samples),
+        "top1_agreement": float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1))),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+    }
+
+
+def main(argv=None):
+    import engine
+    from inference_backends import default_model_path, load_backend
+
+    parser = argparse.ArgumentParser(description="Export the DARTS CNN to TFLite/ONNX with optional quantization.")
+    parser.add_argument("--format", choices=["tflite", "onnx"], default="tflite")
+    parser.add_argument("--quantize", choices=["none", "float16", "int8"], default="none")
+    parser.add_argument("--input", default=engine.CNN_MODEL_PATH, help="Keras .h5 model to convert")
+    parser.add_argument("--output", help="Output path (default: next to the .h5 file)")
+    parser.add_argument("--sample-dir", help="Leaf images for int8 calibration and the parity check")
+    parser.add_argument("--samples", type=int, default=200, help="Max sample images to use")
+    parser.add_argument("--min-agreement", type=float, default=0.98,
+                        help="Fail if top-1 agreement with Keras drops below this")
+    parser.add_argument("--skip-parity", action="store_true")
+    args = parser.parse_args(argv)
+
+    from tensorflow.keras.models import load_model
+
+    output_path = args.output or default_model_path(args.format, args.input)
+    keras_model = load_model(args.input)
+    samples = load_samples(args.sample_dir, args.samples)
+
+    print(f"🔄 Converting {args.input} -> {output_path} ({args.format}, quantize={args.quantize})")
+    if args.format == "tflite":
+        convert_tflite(keras_model, output_path, args.quantize, samples)
+    else:
+        convert_onnx(keras_model, output_path, args.quantize)
+    print(f"✅ Wrote {output_path} ({os.path.getsize(output_path) / 1e6:.1f} MB, "
+          f"source {os.path.getsize(args.input) / 1e6:.1f} MB)")
+
+    if args.skip_parity:
+        return 0
+    report = check_parity(keras_model, load_backend(args.format, output_path), samples)
+    print(f"Parity on {report['samples']} samples: top-1 agreement {report['top1_agreement']:.1%}, "
+          f"max |Δp| {report['max_abs_diff']:.4f}, mean |Δp| {report['mean_abs_diff']:.5f}")
+    if report["top1_agreement"] < args.min_agreement:
+        print(f"❌ Agreement below {args.min_agreement:.0%}; do not deploy this export")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,391 @@
+# Analysis engine for DARTS system
+#
+# The upload analysis pipeline without the web layer: model loading, the
+# validation cascade, micro-batched and TTA inference, tiled scanning and the
+# prediction cache. app.py serves it over HTTP; streamlit_app.py and
+# batch_classify.py import it directly, without Flask, the job queue, the
+# upload store or the live-stream scheduler.
+import os
+import threading
+import time
+
+import numpy as np
+
+from label_catalog import LABELS, lookup, label_name
+from image_loader import DecodedImage, MODEL_INPUT_SIZE, as_decoded_image
+from batching import MicroBatcher
+from validation import ValidationCascade
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from inference_backends import load_backend, default_model_path
+from metrics import MetricsRegistry
+from tta import ViewBudget, augment_views
+from tiles import scan_tiles
+
+# Hot-path instrumentation; app.py adds its request metrics and exports them all at /metrics
+metrics = MetricsRegistry()
+stage_latency = metrics.histogram(
+    "darts_stage_duration_seconds", "Time spent in each request pipeline stage.", ["stage"])
+
+# Model locations
+CNN_MODEL_PATH = "../model/Dataset_cnn.h5"
+
+def model_file_version(path):
+    """Identifies a model file by name and modification time."""
+    try:
+        return f"{os.path.basename(path)}@{int(os.stat(path).st_mtime)}"
+    except OSError:
+        return os.path.basename(path)
+
+# Inference backend for the disease CNN: "keras" (default), "tflite" or "onnx".
+# Exports are produced by convert_model.py next to the .h5 file unless INFERENCE_MODEL_PATH is set.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras').lower()
+INFERENCE_MODEL_PATH = os.environ.get('INFERENCE_MODEL_PATH') or default_model_path(INFERENCE_BACKEND, CNN_MODEL_PATH)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0)) or None
+
+# Reported by the JSON API and part of the prediction cache key; override to pin an explicit release name
+CNN_MODEL_VERSION = os.environ.get('CNN_MODEL_VERSION') or f"{INFERENCE_BACKEND}:{model_file_version(INFERENCE_MODEL_PATH)}"
+
+# Google Drive model URL (you'll need to upload your model and get this URL)
+MODEL_DRIVE_URL = "https://drive.google.com/uc?id=YOUR_MODEL_FILE_ID"
+
+def configure_tensorflow_threads():
+    """Caps TensorFlow's intra-op pool at INFERENCE_THREADS (set per worker by serve.py)."""
+    if not INFERENCE_THREADS:
+        return
+    import tensorflow as tf
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(INFERENCE_THREADS)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except RuntimeError:
+        pass  # TensorFlow already initialised; keep its current pools
+
+def load_rice_model():
+    """Loads the disease CNN through the configured backend, downloading the .h5 first if it is missing."""
+    if INFERENCE_BACKEND != 'keras':
+        return load_backend(INFERENCE_BACKEND, INFERENCE_MODEL_PATH, num_threads=INFERENCE_THREADS)
+
+    configure_tensorflow_threads()
+    from tensorflow.keras.models import load_model
+    try:
+        return load_model(CNN_MODEL_PATH)
+    except Exception as e:
+        print(f"❌ Failed to load CNN model: {e}")
+        print("Attempting to download model...")
+        from download_model import download_model_from_drive
+        download_model_from_drive()
+        return load_model(CNN_MODEL_PATH)
+
+def load_plant_model():
+    """Loads the ImageNet MobileNetV2 used by the last validation stage."""
+    configure_tensorflow_threads()
+    from tensorflow.keras.applications.mobilenet_v2 import MobileNetV2
+    return MobileNetV2(weights="imagenet")
+
+def warmup_model(model):
+    """Runs one dummy inference so the first real request doesn't pay graph-tracing cost."""
+    model.predict(np.zeros((1, 224, 224, 3), dtype=np.float32), verbose=0)
+
+# Models are loaded lazily (or by a background warm-up thread) so importing the engine stays fast.
+# MODEL_LOAD_MODE: "background" (default), "lazy" (on first request) or "eager" (block at startup)
+MODEL_LOAD_MODE = os.environ.get('MODEL_LOAD_MODE', 'background').lower()
+
+model_registry = ModelRegistry()
+model_registry.register("rice_model", load_rice_model, warmup=warmup_model)
+model_registry.register("plant_model", load_plant_model, warmup=warmup_model, required=False)
+
+if MODEL_LOAD_MODE == 'eager':
+    model_registry.warm_up(background=False)
+elif MODEL_LOAD_MODE != 'lazy':
+    model_registry.warm_up(background=True)
+
+# Test-time augmentation: average the CNN over up to TTA_VIEWS crops/flips of
+# each upload in one forward pass, using fewer views if that pass would exceed
+# TTA_LATENCY_BUDGET_MS. TTA_VIEWS=1 (the default) is the plain single view.
+TTA_VIEWS = int(os.environ.get('TTA_VIEWS', 1))
+TTA_LATENCY_BUDGET_MS = float(os.environ.get('TTA_LATENCY_BUDGET_MS', 0))
+tta_budget = ViewBudget(TTA_VIEWS, budget_ms=TTA_LATENCY_BUDGET_MS)
+
+# Content-hash cache of validation verdicts and predictions for repeated uploads
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 1024)),
+    # TTA averages change the scores, so they are cached separately from single-view results;
+    # results the latency budget cut to fewer views are not cached at all (see analyze_upload)
+    model_version=CNN_MODEL_VERSION if tta_budget.max_views == 1 else f"{CNN_MODEL_VERSION}+tta{tta_budget.max_views}",
+    disk_dir=os.environ.get('PREDICTION_CACHE_DIR') or None
+)
+
+# One forward pass at a time per process: request threads never compete for the
+# inference runtime's intra-op thread pool, they queue here (or in the batcher) instead.
+inference_lock = threading.Lock()
+
+def run_inference(model_name, batch):
+    """Runs a forward pass on a registered model, serialized with all other inference in this process."""
+    model = model_registry.get(model_name)
+    with inference_lock:
+        return model.predict(batch, verbose=0)
+
+# Micro-batching: concurrent requests share one rice_model forward pass
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 8))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 10))
+
+rice_batcher = MicroBatcher(
+    lambda batch: run_inference("rice_model", batch),
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    name="rice_model"
+)
+
+def classify_imagenet(rgb_224):
+    """Runs MobileNetV2 on a single 224x224 RGB image and returns the 1000 ImageNet scores."""
+    from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
+    img_array = preprocess_input(np.expand_dims(rgb_224.astype(np.float32), axis=0))
+    return run_inference("plant_model", img_array)[0]
+
+# Tiered validation: darkness -> green ratio -> blur -> MobileNetV2 plant classes
+plant_validator = ValidationCascade(classify_imagenet)
+
+# Tiled scanning (mode=tiles): high-resolution decode, only leaf tiles are classified
+TILE_DECODE_MIN_SIDE = int(os.environ.get('TILE_DECODE_MIN_SIDE', 896))
+TILE_MAX_TILES = int(os.environ.get('TILE_MAX_TILES', 256))
+TILE_BATCH_SIZE = int(os.environ.get('TILE_BATCH_SIZE', 32))
+HEALTHY_CLASS = lookup("Healthy Leaves").index
+
+def analyze_upload(data, progress=None, tiled=False):
+    """Validates and classifies raw upload bytes, reusing cached results for identical uploads.
+
+    Returns a dict with the validation "verdict" ("undecodable", "too_dark",
+    "not_plant" or "ok") and, for valid images, the "prediction" result and
+    the raw class "probabilities". With tiled=True the image is scanned tile
+    by tile (see tiles.py) and the record also has a "tiles" summary. If
+    given, progress(stage, seconds) is called as each of "decode",
+    "validate", "infer" and "format" finishes.
+    """
+    key = prediction_cache.key(data, "tiles" if tiled else None)
+    analysis = prediction_cache.get(key)
+    if analysis is not None:
+        return analysis
+
+    analysis, decoded = validate_upload(data, progress, min_side=TILE_DECODE_MIN_SIDE if tiled else MODEL_INPUT_SIZE[0])
+    if analysis is None:
+        start = time.perf_counter()
+        try:
+            # Batched with concurrent requests (or leaf tiles in batches of their own)
+            with stage_latency.time(stage="predict_disease"):
+                tiled_analysis = tiled_prediction(decoded) if tiled else None
+                if tiled_analysis is None:
+                    probabilities, views = predict_probabilities(decoded)
+        except Exception as e:
+            print(f"Error during prediction: {e}")
+            return {"verdict": "ok", "prediction": invalid_prediction()}  # Not cached: may be transient
+        start = report_stage(progress, "infer", start)
+        analysis = tiled_analysis or prediction_analysis(probabilities)
+        report_stage(progress, "format", start)
+        if tiled_analysis is None and views < tta_budget.max_views:
+            return analysis  # Fewer TTA views under load: not the result the cache key stands for
+
+    prediction_cache.put(key, analysis)
+    return analysis
+
+def validate_upload(data, progress=None, min_side=MODEL_INPUT_SIZE[0]):
+    """Decodes upload bytes once and runs the validation steps.
+
+    Returns (analysis, decoded): analysis is a rejection record, or None when
+    the image passed and should be classified. min_side is passed to
+    DecodedImage.from_bytes (tiled scans need more than the model's 224 px).
+    """
+    start = time.perf_counter()
+    # Decode once in memory; every step below shares this pixel buffer
+    with stage_latency.time(stage="decode"):
+        decoded = DecodedImage.from_bytes(data, min_side=min_side)
+    start = report_stage(progress, "decode", start)
+    if decoded is None:
+        return {"verdict": "undecodable"}, None
+
+    analysis = None
+    with stage_latency.time(stage="is_black_image"):
+        is_black = is_black_image(decoded)
+    if is_black:
+        analysis = {"verdict": "too_dark"}
+    else:
+        with stage_latency.time(stage="is_plant_image"):
+            is_plant = is_plant_image(decoded)
+        if not is_plant:
+            analysis = {"verdict": "not_plant"}
+    report_stage(progress, "validate", start)
+    return analysis, decoded
+
+def report_stage(progress, stage, start):
+    """Calls progress(stage, seconds since start) if a callback was given; returns the new start time."""
+    now = time.perf_counter()
+    if progress is not None:
+        progress(stage, now - start)
+    return now
+
+def prediction_analysis(probabilities):
+    """Cacheable analysis record for an image that passed validation."""
+    return {
+        "verdict": "ok",
+        "prediction": interpret_predictions(probabilities),
+        "probabilities": [float(p) for p in probabilities]
+    }
+
+def tiled_prediction(decoded):
+    """Analysis record from a tiled scan of a high-resolution decode, or None if no tile shows leaf."""
+    scan = scan_tiles(
+        decoded.rgb,
+        lambda batch: run_inference("rice_model", batch),
+        batch_size=TILE_BATCH_SIZE,
+        max_tiles=TILE_MAX_TILES,
+        healthy_class=HEALTHY_CLASS
+    )
+    if scan is None:
+        return None
+    analysis = prediction_analysis(scan.probabilities)
+    analysis["tiles"] = {
+        "image_size": list(scan.image_size),
+        "cell_px": scan.cell_px,
+        "total_tiles": scan.grid[0] * scan.grid[1],
+        "leaf_tiles": scan.leaf_tiles,
+        "lesion_tiles": {label_name(c): n for c, n in scan.lesion_tiles.items()},
+        # Per-class mean score of each heatmap cell; None where no leaf tile was classified
+        "heatmap": {
+            label_name(c): [[None if np.isnan(v) else round(float(v), 3) for v in row] for row in cells]
+            for c, cells in scan.heatmap.items()
+        }
+    }
+    return analysis
+
+def is_black_image(img_source):
+    """Checks if the image is mostly black or too dark (validation cascade stage 1)."""
+    try:
+        decoded = as_decoded_image(img_source)
+        if decoded is None:
+            return True  # Unreadable image is considered black
+
+        # Consider image black if more than 98% of pixels are below the dark threshold
+        return plant_validator.check_darkness(decoded) is not None
+    except Exception as e:
+        print(f"Error checking black image: {e}")
+        return True  # Fail-safe: Assume black if error occurs
+
+def is_plant_image(img_source):
+    """Checks if an image is a plant: cheap color/blur checks first, MobileNetV2 only if inconclusive."""
+    try:
+        decoded = as_decoded_image(img_source)
+        if decoded is None:
+            return False
+        return plant_validator.check_plant(decoded).valid
+    except Exception as e:
+        print(f"Error during plant validation: {e}")
+        return False
+
+def is_rice_or_sugarcane(img_source):
+    """Verifies if the leaf is rice or sugarcane using improved color analysis."""
+    try:
+        decoded = as_decoded_image(img_source)
+        if decoded is None:
+            return False
+            
+        # More permissive threshold for plant detection
+        return decoded.image_stats().green_percentage > 15  # Lowered threshold to be more inclusive
+    except Exception as e:
+        print(f"Error during rice/sugarcane validation: {e}")
+        return False
+
+def preprocess_for_cnn(decoded):
+    """Returns the 224x224x3 float32 input (scaled to [0, 1]) for the disease CNN."""
+    return decoded.model_input().astype(np.float32) / 255.0
+
+def interpret_predictions(predictions):
+    """Turns one row of CNN scores into the primary/secondary prediction result."""
+    # Sort predictions and get the top two indices
+    top_two_indices = predictions.argsort()[-2:][::-1]
+    primary_index = int(top_two_indices[0])
+    secondary_index = int(top_two_indices[1])
+
+    # Get confidence scores for top two predictions
+    primary_confidence = float(predictions[primary_index])
+    secondary_confidence = float(predictions[secondary_index])
+
+    # Validate prediction: If confidence is too low, return "Invalid Input"
+    if primary_confidence < 0.30 or primary_index >= len(LABELS):  # Lowered threshold
+        return invalid_prediction()
+
+    return {
+        "predicted_disease": LABELS[primary_index].name,
+        "confidence_score": primary_confidence,
+        "secondary_disease": label_name(secondary_index),
+        "secondary_confidence_score": secondary_confidence
+    }
+
+def invalid_prediction():
+    """Prediction result used when the image cannot be classified."""
+    return {
+        "predicted_disease": "Invalid Input",
+        "confidence_score": 0.0,
+        "secondary_disease": None,
+        "secondary_confidence_score": 0.0
+    }
+
+def predict_disease(img_source):
+    """Runs CNN model to classify disease and validates confidence levels."""
+    try:
+        # Preprocess the image (shared 224x224 buffer, decoded only once)
+        decoded = as_decoded_image(img_source)
+        if decoded is None:
+            raise ValueError("Unable to decode image")
+
+        # Predict disease using the model (batched with concurrent requests, or TTA views)
+        predictions, _ = predict_probabilities(decoded)
+        return interpret_predictions(predictions)
+    except Exception as e:
+        print(f"Error during prediction: {e}")
+        return invalid_prediction()
+
+def predict_probabilities(decoded):
+    """CNN scores for one DecodedImage and the number of views averaged: via the micro-batcher, or over TTA views."""
+    if tta_budget.max_views > 1:
+        predictions, views = predict_probabilities_batch([decoded])
+        return predictions[0], views
+    return rice_batcher.predict(preprocess_for_cnn(decoded)), 1
+
+def predict_probabilities_batch(decoded_images):
+    """Runs the disease CNN once over a list of DecodedImages; returns (score matrix, views per image).
+
+    With TTA enabled, every image contributes its views to the same stacked
+    batch and each image's rows are averaged back into one score vector.
+    The views may be fewer than TTA_VIEWS when the latency budget is tight:
+    TTA_LATENCY_BUDGET_MS bounds the whole pass, so larger batches get fewer views each.
+    """
+    views = tta_budget.views(len(decoded_images))
+    if views == 1:
+        batch = np.stack([preprocess_for_cnn(decoded) for decoded in decoded_images])
+        return run_inference("rice_model", batch), views
+
+    batch = np.stack([view for decoded in decoded_images for view in augment_views(decoded.rgb, views)])
+    model_registry.get("rice_model")  # Keep a lazy model load out of the per-view timing
+    start = time.perf_counter()
+    predictions = run_inference("rice_model", batch.astype(np.float32) / 255.0)
+    tta_budget.record(time.perf_counter() - start, len(batch), views)
+    return predictions.reshape(len(decoded_images), views, -1).mean(axis=1), views
+
+def predict_disease_batch(img_sources):
+    """Classifies several images with a single CNN forward pass. Returns one result per input."""
+    results = [invalid_prediction() for _ in img_sources]
+    try:
+        decoded_images = [as_decoded_image(source) for source in img_sources]
+        valid = [i for i, decoded in enumerate(decoded_images) if decoded is not None]
+        if not valid:
+            return results
+        predictions, _ = predict_probabilities_batch([decoded_images[i] for i in valid])
+        for row, i in enumerate(valid):
+            results[i] = interpret_predictions(predictions[row])
+    except Exception as e:
+        print(f"Error during batch prediction: {e}")
+    return results
+
+def allowed_file(filename):
+    """Checks if the uploaded file is an allowed image type."""
+    allowed_extensions = {"png", "jpg", "jpeg"}
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
@@ -0,0 +1,65 @@
+# Rendered page fragment cache for DARTS system
+#
+# result.html comes in a handful of shapes: one per disease label, one per
+# "Invalid Input" reason and the pending page. Each differs between requests
+# only in a few fields (image URL, confidence, job id). TemplateCache renders a
+# shape once with a marker in place of each such field, splits the output at
+# the markers, and from then on only joins the static pieces with the escaped
+# per-request values.
+import re
+import threading
+from collections import OrderedDict
+
+from markupsafe import escape
+
+# Plain ASCII survives both HTML escaping and URL quoting inside url_for()
+_MARKER = "__darts_field_{}__"
+_MARKER_RE = re.compile(r"__darts_field_(\w+?)__")
+
+
+class TemplateCache:
+    """Caches render_fn(**context) per key as static pieces around the per-request ``fields``."""
+
+    def __init__(self, render_fn, fields, max_entries=256, name="fragments"):
+        self.render_fn = render_fn
+        self.fields = tuple(fields)
+        self.max_entries = max_entries
+        self.name = name
+        self._pieces = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def render(self, key, context):
+        """Renders context; pages sharing a key must differ only in ``fields``."""
+        with self._lock:
+            pieces = self._pieces.get(key)
+            if pieces is not None:
+                self._pieces.move_to_end(key)
+                self._hits += 1
+        if pieces is None:
+            marked = dict(context, **{field: _MARKER.format(field) for field in self.fields})
+            # Alternates static text and field names: [text, field, text, field, ..., text]
+            pieces = tuple(_MARKER_RE.split(self.render_fn(**marked)))
+            with self._lock:
+                self._misses += 1
+                self._pieces[key] = pieces
+                while len(self._pieces) > self.max_entries:
+                    self._pieces.popitem(last=False)
+
+        values = {field: str(escape(context.get(field, ""))) for field in self.fields}
+        return "".join(piece if i % 2 == 0 else values[piece] for i, piece in enumerate(pieces))
+
+    def clear(self):
+        with self._lock:
+            self._pieces.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._pieces),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
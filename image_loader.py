@@ -0,0 +1,149 @@
+# Image decoding utility for DARTS system
+import os
+import struct
+
+# Decompression-bomb guard: images with more pixels than this are never decoded.
+# 25 MP is ~75 MB as a BGR array, which a 512 MB instance can afford.
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 25_000_000))
+# Also applies OpenCV's own limit to formats probe_image() does not parse
+os.environ.setdefault('OPENCV_IO_MAX_IMAGE_PIXELS', str(MAX_IMAGE_PIXELS))
+
+import numpy as np
+import cv2
+
+from image_stats import image_stats
+
+MODEL_INPUT_SIZE = (224, 224)
+
+# JPEGs are decoded at 1/2, 1/4 or 1/8 scale by libjpeg's DCT scaling whenever
+# the result still covers the model input, instead of decoding every pixel of a
+# 12 MP photo and throwing most of them away. REDUCED_DECODE=0 disables it.
+REDUCED_DECODE = os.environ.get('REDUCED_DECODE', '1') == '1'
+_REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Enough leading bytes to reach a JPEG's frame header past a full (64 KB) EXIF block
+HEADER_PROBE_BYTES = 128 * 1024
+
+# JPEG start-of-frame markers (SOF0-SOF15 except DHT, JPG and DAC) carry the image size
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def probe_image(header):
+    """Reads (format, width, height) from an image's leading bytes without decoding it.
+
+    format is "jpg", "png" or None when the bytes are not a supported image;
+    width and height are None when the header ends before the size is known.
+    """
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(header) < 24 or header[12:16] != b"IHDR":
+            return "png", None, None
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+
+    if header.startswith(b"\xff\xd8"):
+        offset = 2
+        while offset + 4 <= len(header):
+            if header[offset] != 0xFF:
+                return "jpg", None, None  # Corrupt marker stream
+            marker = header[offset + 1]
+            if marker == 0xFF:
+                offset += 1  # Fill byte
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                offset += 2  # Standalone marker, no length field
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                if offset + 9 > len(header):
+                    break
+                height, width = struct.unpack(">HH", header[offset + 5:offset + 9])
+                return "jpg", width, height
+            if marker in (0xD9, 0xDA):
+                break  # End of image / start of scan before any frame header
+            offset += 2 + struct.unpack(">H", header[offset + 2:offset + 4])[0]
+        return "jpg", None, None
+
+    return None, None, None
+
+
+def reduced_decode_flag(image_format, width, height, min_side):
+    """Returns (scale, imdecode flag) for the largest DCT scale-down keeping both sides >= min_side.
+
+    Only JPEG decoders scale natively; other formats (and unknown sizes) decode at full size.
+    """
+    if REDUCED_DECODE and min_side and image_format == "jpg" and width is not None:
+        for scale, flag in _REDUCED_DECODE_FLAGS:
+            if min(width, height) // scale >= min_side:
+                return scale, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+class DecodedImage:
+    """A single decoded upload shared by every validation and prediction step."""
+
+    def __init__(self, bgr):
+        self.bgr = bgr
+        self._model_input = None
+        self._stats = {}
+
+    @classmethod
+    def from_bytes(cls, data, min_side=MODEL_INPUT_SIZE[0]):
+        """Decodes raw upload bytes without touching the disk. Returns None if undecodable.
+
+        JPEGs are decoded straight to the smallest power-of-two reduction whose
+        shorter side is still at least ``min_side`` pixels; pass min_side=None
+        for full resolution.
+        """
+        if not data:
+            return None
+        image_format, width, height = probe_image(bytes(data[:HEADER_PROBE_BYTES]))
+        if width is not None and width * height > MAX_IMAGE_PIXELS:
+            print(f"⚠️  Refusing to decode a {width}x{height} image (limit {MAX_IMAGE_PIXELS} pixels)")
+            return None
+        _, flag = reduced_decode_flag(image_format, width, height, min_side)
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        bgr = cv2.imdecode(buffer, flag)
+        if bgr is None:
+            return None
+        return cls(bgr)
+
+    @classmethod
+    def from_path(cls, img_path, min_side=MODEL_INPUT_SIZE[0]):
+        """Decodes an image stored on disk."""
+        try:
+            with open(img_path, 'rb') as f:
+                return cls.from_bytes(f.read(), min_side=min_side)
+        except OSError:
+            return None
+
+    @property
+    def rgb(self):
+        """Zero-copy RGB view of the BGR pixel buffer."""
+        return self.bgr[:, :, ::-1]
+
+    def image_stats(self, dark_threshold=15):
+        """Fused color statistics (see image_stats.py), computed once per threshold."""
+        stats = self._stats.get(dark_threshold)
+        if stats is None:
+            stats = self._stats[dark_threshold] = image_stats(self.bgr, dark_threshold=dark_threshold)
+        return stats
+
+    def model_input(self):
+        """224x224 RGB uint8 array, resized once and shared by both models."""
+        if self._model_input is None:
+            # Nearest-neighbour matches keras.preprocessing.image.load_img's default
+            resized = cv2.resize(self.bgr, MODEL_INPUT_SIZE, interpolation=cv2.INTER_NEAREST)
+            self._model_input = resized[:, :, ::-1]
+        return self._model_input
+
+
+def as_decoded_image(source):
+    """Accepts a DecodedImage, raw bytes or a file path and returns a DecodedImage (or None)."""
+    if source is None or isinstance(source, DecodedImage):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return DecodedImage.from_bytes(bytes(source))
+    return DecodedImage.from_path(source)
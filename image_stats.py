@@ -0,0 +1,66 @@
+# Fused image statistics for DARTS system
+#
+# One call computes everything the cheap checks need (dark-pixel ratio, mean
+# intensity, leaf-green percentage, per-channel mean/variance) from a single
+# strided subsample, instead of each check converting the full image again.
+import math
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+# HSV range used for the "is there leaf-green in this picture" check
+LOWER_GREEN = np.array([25, 30, 10])
+UPPER_GREEN = np.array([100, 255, 255])
+
+# Statistics are estimated from at most this many pixels (a regular grid).
+# At 64K samples the ratios are within a fraction of a percentage point of the
+# full-image values, far inside the margins of the thresholds that use them.
+STATS_MAX_PIXELS = 64 * 1024
+
+ImageStats = namedtuple("ImageStats", [
+    "dark_ratio",        # Fraction of pixels darker than the dark threshold (grayscale)
+    "mean_intensity",    # Mean grayscale value, 0-255
+    "green_percentage",  # Percentage of pixels in the leaf-green HSV range
+    "mean_rgb",          # (R, G, B) channel means
+    "var_rgb",           # (R, G, B) channel variances
+    "sampled_pixels",
+])
+
+
+def subsample(image, max_pixels=STATS_MAX_PIXELS):
+    """Contiguous regular-grid subsample of an image with at most ~max_pixels pixels."""
+    height, width = image.shape[:2]
+    stride = max(1, math.ceil(math.sqrt(height * width / max_pixels))) if max_pixels else 1
+    if stride == 1:
+        return image
+    return np.ascontiguousarray(image[::stride, ::stride])
+
+
+def image_stats(image, order="bgr", dark_threshold=15, max_pixels=STATS_MAX_PIXELS):
+    """Computes ImageStats for a uint8 BGR (OpenCV) or RGB (PIL) image; an alpha channel is ignored."""
+    if image.shape[2] == 4:
+        image = image[:, :, :3]
+    sample = subsample(image, max_pixels)
+    if order == "rgb":
+        gray = cv2.cvtColor(sample, cv2.COLOR_RGB2GRAY)
+        hsv = cv2.cvtColor(sample, cv2.COLOR_RGB2HSV)
+    else:
+        gray = cv2.cvtColor(sample, cv2.COLOR_BGR2GRAY)
+        hsv = cv2.cvtColor(sample, cv2.COLOR_BGR2HSV)
+
+    means, stddevs = cv2.meanStdDev(sample)
+    means, variances = means.ravel(), stddevs.ravel() ** 2
+    if order != "rgb":
+        means, variances = means[::-1], variances[::-1]
+
+    pixels = gray.size
+    green = cv2.countNonZero(cv2.inRange(hsv, LOWER_GREEN, UPPER_GREEN))
+    return ImageStats(
+        dark_ratio=np.count_nonzero(gray < dark_threshold) / pixels,
+        mean_intensity=float(cv2.mean(gray)[0]),
+        green_percentage=green / pixels * 100,
+        mean_rgb=tuple(float(v) for v in means),
+        var_rgb=tuple(float(v) for v in variances),
+        sampled_pixels=pixels,
+    )
@@ -0,0 +1,107 @@
+# Pluggable inference backends for the DARTS disease CNN
+#
+# Every backend exposes predict(batch, verbose=0) -> (N, num_classes) scores, so
+# it can stand in for the Keras model anywhere in engine.py.
+import threading
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "onnx")
+
+
+class KerasBackend:
+    """Runs the original .h5 model through full Keras."""
+
+    name = "keras"
+
+    def __init__(self, model_path):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(model_path)
+
+    def predict(self, batch, verbose=0):
+        return self.model.predict(batch, verbose=verbose)
+
+
+class TFLiteBackend:
+    """Runs a .tflite export (float32, float16 or int8 quantized)."""
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe and resizing reallocates tensors
+        self._lock = threading.Lock()
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], batch.shape)
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self._input['index'], self._quantize(batch))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']))
+
+    def _quantize(self, batch):
+        dtype = self._input['dtype']
+        if dtype == np.float32:
+            return batch
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        if output.dtype == np.float32:
+            return output
+        scale, zero_point = self._output['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+
+class OnnxBackend:
+    """Runs a .onnx export through onnxruntime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch, verbose=0):
+        batch = np.asarray(batch, dtype=np.float32)
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def load_backend(backend, model_path, num_threads=None):
+    """Builds the named backend ("keras", "tflite" or "onnx") for the given model file."""
+    backend = (backend or "keras").lower()
+    if backend == "keras":
+        return KerasBackend(model_path)
+    if backend == "tflite":
+        return TFLiteBackend(model_path, num_threads=num_threads)
+    if backend == "onnx":
+        return OnnxBackend(model_path, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend '{backend}'; expected one of {', '.join(BACKENDS)}")
+
+
+def default_model_path(backend, keras_path):
+    """Where convert_model.py writes the export for a backend, next to the .h5 file."""
+    if backend == "tflite":
+        return keras_path.rsplit('.', 1)[0] + ".tflite"
+    if backend == "onnx":
+        return keras_path.rsplit('.', 1)[0] + ".onnx"
+    return keras_path
@@ -0,0 +1,114 @@
+# Background inference jobs for DARTS system
+import queue
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the backlog is at capacity."""
+
+
+class JobQueue:
+    """Bounded queue of jobs processed by a pool of background worker threads.
+
+    ``submit`` returns a job id immediately, or raises QueueFull once
+    ``max_pending`` jobs are waiting, so a burst of uploads cannot grow the
+    backlog (and memory) without limit. Finished jobs are kept for
+    ``result_ttl`` seconds (at most ``max_results`` of them) for polling.
+    """
+
+    def __init__(self, process_fn, max_pending=32, workers=2, result_ttl=600, max_results=1000, name="jobs"):
+        self.process_fn = process_fn
+        self.max_pending = max(1, int(max_pending))
+        self.workers = max(1, int(workers))
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.name = name
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._jobs = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    def submit(self, payload):
+        """Queues process_fn(payload) and returns the new job id."""
+        self._ensure_workers()
+        job_id = secrets.token_urlsafe(16)
+        job = {"id": job_id, "status": "queued", "payload": payload, "result": None, "error": None,
+               "created": time.time(), "started": None, "finished": None}
+        with self._cond:
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._stats["rejected"] += 1
+                raise QueueFull(f"{self.name}: {self.max_pending} jobs already pending")
+            self._jobs[job_id] = job
+            self._stats["submitted"] += 1
+        return job_id
+
+    def get(self, job_id, wait=0):
+        """Returns a snapshot of the job, or None if unknown/expired.
+
+        With ``wait`` > 0, blocks up to that many seconds for the job to finish
+        (long-polling).
+        """
+        deadline = time.monotonic() + max(0.0, wait)
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if job["status"] in ("done", "failed") or remaining <= 0:
+                    return dict(job)
+                self._cond.wait(remaining)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "name": self.name,
+                "max_pending": self.max_pending,
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "running": sum(1 for job in self._jobs.values() if job["status"] == "running"),
+                "retained": len(self._jobs),
+                **self._stats,
+            }
+
+    def _expire(self):
+        # Caller holds self._cond
+        cutoff = time.time() - self.result_ttl
+        finished = [job_id for job_id, job in self._jobs.items() if job["finished"] is not None]
+        excess = len(finished) - self.max_results
+        for i, job_id in enumerate(finished):
+            if i < excess or self._jobs[job_id]["finished"] < cutoff:
+                del self._jobs[job_id]
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._cond:
+            if not self._threads:
+                for i in range(self.workers):
+                    thread = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            with self._cond:
+                job["status"] = "running"
+                job["started"] = time.time()
+            try:
+                result, error, status = self.process_fn(job["payload"]), None, "done"
+            except Exception as e:
+                print(f"Error in {self.name} job {job['id']}: {e}")
+                result, error, status = None, str(e), "failed"
+            with self._cond:
+                job.update(status=status, result=result, error=error, finished=time.time())
+                self._stats[status] += 1
+                self._cond.notify_all()
@@ -0,0 +1,111 @@
+# Disease label catalog for DARTS system
+#
+# One immutable record per CNN output class, built once at import from
+# disease_info.disease_data: the label, its detail lists, severity indicator
+# and its detail sections pre-rendered as result-page HTML and as Streamlit
+# Markdown. LABELS is in model output order, so an index from a prediction row
+# is the record itself.
+from collections import namedtuple
+from html import escape
+from types import MappingProxyType
+
+from disease_info import disease_data
+
+# Class names in the order of the disease CNN's output vector
+CLASS_NAMES = (
+    "BacterialBlight",
+    "Banded Chlorosis",
+    "Brownspot (Rice)",
+    "Brown Spot (Sugarcane)",
+    "BrownRust",
+    "Dried Leaves",
+    "Grassy shoot",
+    "Healthy Leaves",
+    "Leafsmut",
+    "Tungro",
+    "Yellow Leaf",
+)
+
+HEALTHY = "Healthy Leaves"
+SEVERE = frozenset({"BacterialBlight", "Tungro", "Brownspot (Rice)"})
+
+INDICATOR_MESSAGES = MappingProxyType({
+    "healthy": "Excellent! Your plant appears healthy.",
+    "mild": "Potential issue detected - monitor closely.",
+    "severe": "Disease detected - immediate attention needed.",
+})
+
+Label = namedtuple("Label", [
+    "index",         # Position in the model output, None for labels the model cannot emit
+    "name",
+    "type",
+    "symptoms",      # Tuples of strings
+    "causes",
+    "management",
+    "indicator",     # "healthy", "mild" or "severe"
+    "details",       # Read-only mapping in the disease_data shape, for templates
+    "details_html",  # Escaped result.html detail sections
+    "markdown",      # Streamlit expander bodies: {"symptoms", "causes", "management"}
+])
+
+
+def _details_html(type_, symptoms, causes, management):
+    def items(values):
+        return "".join(f"<li>{escape(value)}</li>" for value in values)
+    return (
+        f'<div class="section"><h3>Disease Information:</h3><p><strong>Type:</strong> {escape(type_)}</p></div>'
+        f'<div class="section"><h3>Symptoms:</h3><ul>{items(symptoms)}</ul></div>'
+        f'<div class="section"><h3>Possible Causes:</h3><ul>{items(causes)}</ul></div>'
+        f'<div class="section"><h3>Management Strategies:</h3><ul>{items(management)}</ul></div>'
+    )
+
+
+def _markdown(symptoms, causes, management):
+    # "  \n" is a Markdown line break: one st.markdown call per list instead of one per item
+    return MappingProxyType({
+        "symptoms": "  \n".join(f"• {value}" for value in symptoms),
+        "causes": "  \n".join(f"• {value}" for value in causes),
+        "management": "  \n".join(f"**{i}.** {value}" for i, value in enumerate(management, 1)),
+    })
+
+
+def make_label(name, info, index=None, indicator=None):
+    """Builds an immutable Label from a disease_data-style dict."""
+    if indicator is None:
+        indicator = "healthy" if name == HEALTHY else "severe" if name in SEVERE else "mild"
+    type_ = info.get("Type", "Unknown")
+    symptoms = tuple(info.get("Symptoms", ()))
+    causes = tuple(info.get("Causes", ()))
+    management = tuple(info.get("Management Strategies", ()))
+    details = MappingProxyType({
+        "Type": type_,
+        "Symptoms": symptoms,
+        "Causes": causes,
+        "Management Strategies": management,
+        "Indicator": indicator,
+        "Indicator_Message": INDICATOR_MESSAGES[indicator],
+    })
+    return Label(index, name, type_, symptoms, causes, management, indicator, details,
+                 _details_html(type_, symptoms, causes, management), _markdown(symptoms, causes, management))
+
+
+LABELS = tuple(make_label(name, disease_data[name], index=i) for i, name in enumerate(CLASS_NAMES))
+BY_NAME = MappingProxyType({label.name: label for label in LABELS})
+
+# Details shown for a name outside the catalog
+UNKNOWN = make_label("Unknown", {
+    "Type": "Unknown",
+    "Symptoms": ["No information available"],
+    "Causes": ["No information available"],
+    "Management Strategies": ["No information available"],
+}, indicator="healthy")
+
+
+def label_name(index):
+    """Label name for a model output index, "Unknown" if the model has more outputs than the catalog."""
+    return LABELS[index].name if 0 <= index < len(LABELS) else UNKNOWN.name
+
+
+def lookup(name):
+    """The Label for a class name, or UNKNOWN."""
+    return BY_NAME.get(name, UNKNOWN)
@@ -0,0 +1,183 @@
+# Live camera stream classification for DARTS system
+#
+# Each scanning client opens a stream session and posts frames to it. A session
+# holds at most one unprocessed frame: a newer frame replaces it (latest frame
+# wins), so a client sending faster than the server can classify only costs
+# dropped frames, never queued memory. One scheduler thread takes the pending
+# frame of every session, classifies them as one batch and folds each result
+# into the session's exponential moving average of class probabilities.
+import secrets
+import threading
+import time
+
+import numpy as np
+
+
+class StreamLimitReached(Exception):
+    """Raised by StreamScheduler.open when max_sessions streams are already active."""
+
+
+class StreamSession:
+    __slots__ = ("id", "pending", "ema", "frame_status", "invalid_streak", "received", "processed",
+                 "dropped", "opened", "last_seen", "last_processed")
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.pending = None         # Latest unprocessed frame bytes
+        self.ema = None             # Smoothed class probabilities
+        self.frame_status = "waiting"
+        self.invalid_streak = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.opened = self.last_seen = time.monotonic()
+        self.last_processed = None
+
+
+class StreamScheduler:
+    """Classifies the latest frame of each open stream in shared batches and smooths results over time.
+
+    classify_batch(frames) takes a list of frame bytes and returns, for each,
+    (status, probabilities): status "ok" with a probability vector, or a
+    rejection status ("too_dark", "not_plant", ...) with None. The smoothed
+    vector is ``alpha * new + (1 - alpha) * previous``; it is reset after
+    ``reset_after`` consecutive rejected frames so a stale label does not
+    linger when the camera moves away from the leaf.
+    """
+
+    def __init__(self, classify_batch, max_sessions=32, max_batch_size=8, alpha=0.3, reset_after=3,
+                 idle_timeout=30, name="stream"):
+        self.classify_batch = classify_batch
+        self.max_sessions = max_sessions
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.alpha = alpha
+        self.reset_after = reset_after
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self._sessions = {}
+        self._cond = threading.Condition()
+        self._worker = None
+        self._stats = {"opened": 0, "closed": 0, "expired": 0, "frames": 0, "dropped": 0, "batches": 0}
+
+    def open(self):
+        """Starts a stream session and returns its id."""
+        self._ensure_worker()
+        with self._cond:
+            self._expire()
+            if len(self._sessions) >= self.max_sessions:
+                raise StreamLimitReached(f"{self.name}: {self.max_sessions} streams already open")
+            session_id = secrets.token_urlsafe(12)
+            self._sessions[session_id] = StreamSession(session_id)
+            self._stats["opened"] += 1
+        return session_id
+
+    def push(self, session_id, frame):
+        """Hands a frame to a session, replacing any frame not yet classified. Returns the snapshot or None."""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if session.pending is not None:
+                session.dropped += 1
+                self._stats["dropped"] += 1
+            session.pending = frame
+            session.received += 1
+            session.last_seen = time.monotonic()
+            self._stats["frames"] += 1
+            self._cond.notify()
+            return self._snapshot(session)
+
+    def snapshot(self, session_id):
+        """Current smoothed state of a session, or None if it is unknown or expired."""
+        with self._cond:
+            session = self._sessions.get(session_id)
+            return self._snapshot(session) if session is not None else None
+
+    def close(self, session_id):
+        with self._cond:
+            if self._sessions.pop(session_id, None) is not None:
+                self._stats["closed"] += 1
+                return True
+            return False
+
+    def stats(self):
+        with self._cond:
+            return {
+                "name": self.name,
+                "active": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "pending_frames": sum(1 for s in self._sessions.values() if s.pending is not None),
+                **self._stats,
+            }
+
+    def _snapshot(self, session):
+        # Caller holds self._cond
+        elapsed = time.monotonic() - session.opened
+        return {
+            "stream_id": session.id,
+            "frame_status": session.frame_status,
+            "probabilities": None if session.ema is None else session.ema.tolist(),
+            "frames": {"received": session.received, "processed": session.processed, "dropped": session.dropped},
+            "processed_fps": session.processed / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def _expire(self):
+        # Caller holds self._cond
+        cutoff = time.monotonic() - self.idle_timeout
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_seen < cutoff]:
+            del self._sessions[session_id]
+            self._stats["expired"] += 1
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._cond:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"{self.name}-scheduler", daemon=True)
+                self._worker.start()
+
+    def _take_batch(self):
+        # Caller holds self._cond; longest-waiting sessions first so every stream gets its turn
+        ready = [s for s in self._sessions.values() if s.pending is not None]
+        ready.sort(key=lambda s: s.last_processed or 0.0)
+        batch = []
+        for session in ready[:self.max_batch_size]:
+            batch.append((session, session.pending))
+            session.pending = None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+                while not batch:
+                    self._cond.wait(timeout=self.idle_timeout)
+                    self._expire()
+                    batch = self._take_batch()
+            try:
+                results = self.classify_batch([frame for _, frame in batch])
+            except Exception as e:
+                print(f"Error classifying {self.name} frames: {e}")
+                results = [("error", None)] * len(batch)
+            with self._cond:
+                self._stats["batches"] += 1
+                now = time.monotonic()
+                for (session, _), (status, probabilities) in zip(batch, results):
+                    self._update(session, status, probabilities)
+                    session.last_processed = now
+
+    def _update(self, session, status, probabilities):
+        # Caller holds self._cond
+        session.processed += 1
+        session.frame_status = status
+        if status != "ok":
+            session.invalid_streak += 1
+            if session.invalid_streak >= self.reset_after:
+                session.ema = None
+            return
+        session.invalid_streak = 0
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if session.ema is None:
+            session.ema = probabilities
+        else:
+            session.ema = self.alpha * probabilities + (1.0 - self.alpha) * session.ema
@@ -0,0 +1,97 @@
+# Lazy, warm-started model registry for DARTS system
+import threading
+import time
+
+
+class _ModelEntry:
+    def __init__(self, name, loader, warmup, required):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.required = required
+        self.model = None
+        self.state = "unloaded"
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Loads models on first use (or in a background warm-up thread) instead of at import time."""
+
+    def __init__(self):
+        self._entries = {}
+        self._warmup_thread = None
+
+    def register(self, name, loader, warmup=None, required=True):
+        """Registers a zero-argument loader and an optional warmup(model) callback."""
+        self._entries[name] = _ModelEntry(name, loader, warmup, required)
+
+    def get(self, name):
+        """Returns the loaded model, loading and warming it up on first use."""
+        entry = self._entries[name]
+        if entry.model is not None:
+            return entry.model
+        with entry.lock:
+            if entry.model is not None:
+                return entry.model
+            entry.state = "loading"
+            entry.error = None
+            try:
+                start = time.perf_counter()
+                print(f"Loading {name}...")
+                model = entry.loader()
+                entry.load_seconds = time.perf_counter() - start
+                if entry.warmup is not None:
+                    start = time.perf_counter()
+                    entry.warmup(model)
+                    entry.warmup_seconds = time.perf_counter() - start
+            except Exception as e:
+                entry.state = "failed"
+                entry.error = str(e)
+                print(f"❌ Failed to load {name}: {e}")
+                raise
+            entry.model = model
+            entry.state = "ready"
+            print(f"✅ {name} loaded in {entry.load_seconds:.2f}s")
+            return model
+
+    def warm_up(self, names=None, background=True):
+        """Loads the given models (default: all) eagerly, optionally in a daemon thread."""
+        names = list(names or self._entries)
+
+        def _load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # Already recorded in the entry status
+
+        if not background:
+            _load_all()
+            return None
+        if self._warmup_thread is None or not self._warmup_thread.is_alive():
+            self._warmup_thread = threading.Thread(target=_load_all, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def is_loaded(self, name):
+        return self._entries[name].model is not None
+
+    def is_ready(self):
+        """True once every required model is loaded and warmed up."""
+        return all(entry.model is not None for entry in self._entries.values() if entry.required)
+
+    def status(self):
+        """Per-model state for health/readiness endpoints."""
+        return {
+            name: {
+                "state": entry.state,
+                "required": entry.required,
+                "load_seconds": entry.load_seconds,
+                "warmup_seconds": entry.warmup_seconds,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
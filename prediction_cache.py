@@ -0,0 +1,128 @@
+# Content-hash prediction cache for DARTS system
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """LRU cache of pipeline results keyed by a hash of the raw upload bytes and the model version.
+
+    Entries are JSON-serialisable dicts. When ``disk_dir`` is set, entries are
+    also written there (sharded by key prefix) so they survive restarts; the
+    disk store is trimmed to ``max_disk_entries`` oldest-first.
+    """
+
+    def __init__(self, max_entries=1024, model_version="", disk_dir=None, max_disk_entries=10000):
+        self.max_entries = max(0, int(max_entries))
+        self.model_version = model_version
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "disk_evictions": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, data, variant=None):
+        """Cache key for raw upload bytes under the current model version.
+
+        ``variant`` separates results of other analysis modes (e.g. "tiles") for the same bytes.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        version = f"{self.model_version}/{variant}" if variant else self.model_version
+        return hashlib.sha256(f"{version}:{digest}".encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached entry or None."""
+        if self.max_entries == 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return entry
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._store(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """Stores an entry in memory (and on disk when configured)."""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, size=len(self._entries), max_entries=self.max_entries,
+                        model_version=self.model_version, disk_dir=self.disk_dir)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)  # Atomic so readers never see a half-written entry
+        except OSError as e:
+            print(f"Warning: could not persist cache entry: {e}")
+            return
+        with self._lock:
+            self._disk_writes += 1
+            trim = self._disk_writes % 100 == 0
+        if trim:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        files.append((os.path.getmtime(path), path))
+                    except OSError:
+                        continue
+        excess = len(files) - self.max_disk_entries
+        if excess <= 0:
+            return
+        for _, path in sorted(files)[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        with self._lock:
+            self._counters["disk_evictions"] += excess
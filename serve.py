@@ -0,0 +1,142 @@
+# Production server entry point for DARTS system
+#
+# Serves app.py through waitress instead of Flask's development server.
+#
+#   python serve.py                        # 1 process, WEB_THREADS request threads
+#   WEB_WORKERS=2 python serve.py          # pre-forked processes sharing one socket,
+#                                          # each with its own model copy
+#
+# SIGTERM/SIGINT stop accepting connections, let in-flight requests finish,
+# then exit (Render and Heroku send SIGTERM on deploy/scale-down).
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+HOST = os.environ.get('HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5000))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 1))
+CONNECTION_LIMIT = int(os.environ.get('WEB_CONNECTION_LIMIT', 100))
+SHUTDOWN_TIMEOUT = float(os.environ.get('WEB_SHUTDOWN_TIMEOUT', 30))
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def serve_worker(sock, threads):
+    """Runs one waitress server on an already-bound socket until SIGTERM/SIGINT."""
+    from waitress.channel import HTTPChannel
+    from waitress.server import create_server
+    from app import app
+
+    # Waitress answers 413 itself, before reading the body, when it exceeds the app's upload limit
+    server = create_server(app, sockets=[sock], threads=threads, connection_limit=CONNECTION_LIMIT,
+                           max_request_body_size=app.config['MAX_CONTENT_LENGTH'], ident="darts")
+
+    stop_requested = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_requested.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stop_requested.append(signum))
+
+    print(f"[{os.getpid()}] Serving on http://{HOST}:{PORT} with {threads} threads")
+    deadline = None
+    while True:
+        server.asyncore.loop(timeout=1.0, map=server._map, use_poll=server.adj.asyncore_use_poll, count=1)
+        if not stop_requested:
+            continue
+        if deadline is None:
+            print(f"[{os.getpid()}] Shutting down: finishing in-flight requests...")
+            server.close()  # Stop accepting new connections
+            deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        if not any(isinstance(channel, HTTPChannel) for channel in list(server._map.values())):
+            break
+        if time.monotonic() > deadline:
+            print(f"[{os.getpid()}] Shutdown timeout reached; dropping open connections")
+            break
+    server.task_dispatcher.shutdown(cancel_pending=False, timeout=SHUTDOWN_TIMEOUT)
+    print(f"[{os.getpid()}] Stopped")
+
+
+def serve_multiprocess(sock, workers, threads):
+    """Pre-forks worker processes that share the listening socket; restarts any that crash."""
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                serve_worker(sock, threads)
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = children.pop(pid, None)
+        if not stopping and started is not None:
+            print(f"⚠️  Worker {pid} exited with status {status}; restarting")
+            if time.monotonic() - started < 5:
+                time.sleep(1)  # Avoid a tight crash loop
+            spawn()
+
+
+def main():
+    try:
+        import waitress  # noqa: F401
+    except ImportError:
+        print("Warning: waitress not available, using Flask development server")
+        from app import app
+        app.run(host=HOST, port=PORT, debug=False, threaded=True)
+        return 0
+
+    workers = WEB_WORKERS if hasattr(os, 'fork') else 1
+    if workers > 1:
+        # Split the cores between workers so their inference thread pools don't oversubscribe the CPU
+        os.environ.setdefault('INFERENCE_THREADS', str(max(1, (os.cpu_count() or 1) // workers)))
+
+    sock = bind_socket(HOST, PORT)
+    if workers > 1:
+        print(f"Starting {workers} workers x {WEB_THREADS} threads")
+        serve_multiprocess(sock, workers, WEB_THREADS)
+    else:
+        serve_worker(sock, WEB_THREADS)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# Fingerprinted static assets for DARTS system
+#
+# Reads static/build/manifest.json written by build_assets.py. Templates use
+# assets.url() for single files, assets.picture() for <picture>/srcset markup
+# and assets.background() for CSS image-set() backgrounds; before a build they
+# fall back to the plain /static URLs. Fingerprinted files never change, so
+# they are served as immutable, gzip-precompressed where a .gz exists.
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import Response, request, send_from_directory, url_for
+from markupsafe import Markup, escape
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Browsers take the first <source>/image-set() type they support, so smallest formats go first
+FORMAT_PREFERENCE = ("image/avif", "image/webp")
+
+
+class AssetManifest:
+    """URLs and responsive markup for the assets listed in a build manifest."""
+
+    def __init__(self, static_dir, build_dir="build", endpoint="built_asset"):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.endpoint = endpoint
+        self.entries = self._load()
+
+    def _load(self):
+        path = os.path.join(self.static_dir, self.build_dir, "manifest.json")
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _url(self, path):
+        # Manifest paths are relative to static/, e.g. "build/hero-640w.<hash>.webp"
+        return url_for(self.endpoint, filename=path[len(self.build_dir) + 1:])
+
+    def _formats(self, entry):
+        """(mimetype, [[width, path], ...]) pairs in preference order, the fallback format last."""
+        variants = entry["variants"]
+        ordered = [mimetype for mimetype in FORMAT_PREFERENCE if mimetype in variants]
+        return [(mimetype, variants[mimetype]) for mimetype in ordered + [entry["fallback"]]]
+
+    def _srcset(self, variants):
+        return ", ".join(f"{self._url(path)} {width}w" for width, path in variants)
+
+    def url(self, filename):
+        """Fingerprinted URL of an asset as it was uploaded, e.g. assets.url('assets/hakdog.png')."""
+        entry = self.entries.get(filename)
+        if entry is None:
+            return url_for('static', filename=filename)
+        return self._url(entry["original"])
+
+    def picture(self, filename, alt="", sizes="100vw", **attrs):
+        """<picture> with AVIF/WebP sources and a JPEG/PNG <img> fallback, all as width srcsets.
+
+        Extra keyword arguments become <img> attributes (loading="lazy", ...).
+        """
+        attributes = "".join(f' {name}="{escape(value)}"' for name, value in attrs.items())
+        entry = self.entries.get(filename)
+        if entry is None or not entry.get("variants"):
+            return Markup(f'<img src="{escape(self.url(filename))}" alt="{escape(alt)}"{attributes} />')
+
+        *formats, (_, fallback) = self._formats(entry)
+        sources = "".join(
+            f'<source type="{mimetype}" srcset="{escape(self._srcset(candidates))}" sizes="{escape(sizes)}" />'
+            for mimetype, candidates in formats
+        )
+        # Browsers without srcset get a mid-size fallback rather than the largest one
+        src = next((path for width, path in reversed(fallback) if width <= 1280), fallback[0][1])
+        return Markup(
+            f'<picture>{sources}<img src="{escape(self._url(src))}" srcset="{escape(self._srcset(fallback))}" '
+            f'sizes="{escape(sizes)}" alt="{escape(alt)}"{attributes} /></picture>'
+        )
+
+    def background(self, filename, width):
+        """CSS background-image declarations for the variants closest to ``width`` px, with image-set()."""
+        entry = self.entries.get(filename)
+        if entry is None or not entry.get("variants"):
+            return Markup(f'background-image: url("{escape(self.url(filename))}");')
+
+        def closest(candidates):
+            return next((path for w, path in candidates if w >= width), candidates[-1][1])
+
+        formats = self._formats(entry)
+        options = ", ".join(
+            f'url("{escape(self._url(closest(candidates)))}") type("{mimetype}")'
+            for mimetype, candidates in formats
+        )
+        fallback = self._url(closest(formats[-1][1]))
+        return Markup(f'background-image: url("{escape(fallback)}"); background-image: image-set({options});')
+
+    def send(self, filename):
+        """Serves a built file as immutable, using its precompressed .gz when the client accepts gzip."""
+        directory = os.path.join(self.static_dir, self.build_dir)
+        if "gzip" in request.accept_encodings and os.path.isfile(os.path.join(directory, filename + ".gz")):
+            response = send_from_directory(directory, filename + ".gz",
+                                           mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream")
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = send_from_directory(directory, filename)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+class PrecompressedPages:
+    """Pages that are the same for every visitor, rendered and gzip-compressed once per key."""
+
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def respond(self, key, render_fn):
+        page = self._pages.get(key)
+        if page is None:
+            body = render_fn().encode("utf-8")
+            page = (body, gzip.compress(body, compresslevel=9, mtime=0), hashlib.sha256(body).hexdigest()[:16])
+            with self._lock:
+                self._pages[key] = page
+        body, compressed, etag = page
+
+        if "gzip" in request.accept_encodings:
+            response = Response(compressed, mimetype="text/html")
+            response.headers["Content-Encoding"] = "gzip"
+            response.set_etag(etag + "-gz")
+        else:
+            response = Response(body, mimetype="text/html")
+            response.set_etag(etag)
+        # HTML names the current asset fingerprints, so it is revalidated (cheap 304) on every visit
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response.make_conditional(request)
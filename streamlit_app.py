@@ -1,8 +1,11 @@
+import os
 import streamlit as st
 import numpy as np
 from PIL import Image
 import time
 
+from image_stats import image_stats
+
 # Page configuration
 st.set_page_config(
     page_title="DARTS - Disease Detection System",
@@ -106,68 +109,98 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Import disease data from the main app
-try:
-    from disease_info import disease_data
-except ImportError:
-    # Fallback disease data if import fails
-    disease_data = {
-        "BacterialBlight": {
-            "Type": "Bacterial Disease",
-            "Symptoms": ["Water-soaked lesions on leaves", "Yellow to brown streaks"],
-            "Causes": ["Xanthomonas oryzae bacteria", "High humidity conditions"],
-            "Management Strategies": ["Use resistant rice varieties", "Apply copper-based bactericides"]
-        },
-        "Healthy Leaves": {
-            "Type": "Normal Condition",
-            "Symptoms": ["Vibrant green color", "Normal leaf shape"],
-            "Causes": ["Proper nutrition", "Adequate water supply"],
-            "Management Strategies": ["Continue current management practices", "Regular monitoring"]
-        },
-        "Dried Leaves": {
-            "Type": "Environmental Stress",
-            "Symptoms": ["Leaf margins turning brown", "Wilting and drying"],
-            "Causes": ["Water stress/drought", "High temperature"],
-            "Management Strategies": ["Ensure adequate irrigation", "Apply mulching"]
-        },
-        "Tungro": {
-            "Type": "Viral Disease",
-            "Symptoms": ["Yellow-orange discoloration", "Stunted growth"],
-            "Causes": ["Rice tungro virus", "Green leafhopper transmission"],
-            "Management Strategies": ["Control green leafhopper", "Use tungro-resistant varieties"]
-        },
-        "Brownspot (Rice)": {
-            "Type": "Fungal Disease",
-            "Symptoms": ["Small brown spots on leaves", "Spots with yellow halos"],
-            "Causes": ["Bipolaris oryzae fungus", "High humidity and temperature"],
-            "Management Strategies": ["Apply fungicides", "Improve field drainage"]
-        }
-    }
+# Labels, severity and disease details shared with app.py
+from label_catalog import BY_NAME, INDICATOR_MESSAGES, lookup
+
+# "cnn" runs the same engine as app.py (engine.py: validation + disease CNN);
+# "color" uses the lightweight color heuristic in analyze_image below
+INFERENCE_MODE = os.environ.get('STREAMLIT_INFERENCE', 'cnn').lower()
+
+# Label and progress-bar value shown when each engine stage finishes
+ANALYSIS_STAGES = {
+    "decode": ("🔍 Image decoded", 25),
+    "validate": ("🌿 Leaf checks done", 50),
+    "infer": ("🧠 Disease model finished", 85),
+    "format": ("📊 Results ready", 100),
+    "color analysis": ("🎨 Color analysis finished", 100),
+}
 
-# Disease mapping for prediction
-disease_mapping = {
-    0: "BacterialBlight",
-    1: "Banded Chlorosis",
-    2: "Brownspot (Rice)",
-    3: "Brown Spot (Sugarcane)",
-    4: "BrownRust",
-    5: "Dried Leaves",
-    6: "Grassy shoot",
-    7: "Healthy Leaves",
-    8: "Leafsmut",
-    9: "Tungro",
-    10: "Yellow Leaf"
+REJECTION_MESSAGES = {
+    "undecodable": "The file could not be read as an image.",
+    "too_dark": "The image is too dark or black. Retake it with more light.",
+    "not_plant": "This does not look like a plant leaf. Upload a rice or sugarcane leaf.",
+    "low_confidence": "The image does not match any rice or sugarcane disease the model knows.",
 }
 
+@st.cache_resource(show_spinner="Loading the disease model (first run only)...")
+def load_engine():
+    """Imports the analysis engine once per process (shared by every session) and warms its models.
+
+    Returns (engine, None), or (None, error message) when it cannot load. The
+    failure is cached like a success, so later reruns go straight to the color
+    heuristic instead of retrying the import and model load on every click.
+    """
+    os.environ.setdefault('MODEL_LOAD_MODE', 'lazy')
+    try:
+        import engine
+        engine.model_registry.warm_up(background=False)
+    except Exception as e:
+        return None, str(e)
+    if not engine.model_registry.is_ready():
+        return None, engine.model_registry.status()["rice_model"]["error"] or "disease model not loaded"
+    return engine, None
+
+# Analyses kept per session, so reruns and re-clicks on the same upload skip inference
+ANALYSIS_MEMO_ENTRIES = 128
+
+def cnn_analysis(engine, file_id, data, progress=None):
+    """The engine's analyze_upload, memoized in st.session_state per uploaded file and model version.
+
+    Not st.cache_data: progress updates Streamlit elements created outside the
+    function, which cache_data would record and fail to replay on a hit.
+    """
+    memo = st.session_state.setdefault("cnn_analyses", {})
+    key = (file_id, engine.CNN_MODEL_VERSION)
+    if key in memo:
+        memo[key] = memo.pop(key)  # Most recently used last
+        return memo[key]
+    analysis = engine.analyze_upload(data, progress=progress)
+    memo[key] = analysis
+    while len(memo) > ANALYSIS_MEMO_ENTRIES:
+        del memo[next(iter(memo))]
+    return analysis
+
+def classify_upload(uploaded_file, image, progress=None):
+    """Returns (label, confidence, rejection reason or None) from the CNN, or the color heuristic as fallback.
+
+    progress(stage, seconds) is called as each pipeline stage finishes.
+    """
+    if INFERENCE_MODE == "cnn":
+        engine, error = load_engine()
+        if engine is None:
+            st.warning(f"CNN model unavailable ({error}); using color-based analysis instead.")
+        else:
+            analysis = cnn_analysis(engine, uploaded_file.file_id, uploaded_file.getvalue(), progress)
+            if analysis["verdict"] != "ok":
+                return "Invalid Input", 0.0, analysis["verdict"]
+            prediction = analysis["prediction"]
+            if prediction["predicted_disease"] == "Invalid Input":
+                return "Invalid Input", 0.0, "low_confidence"
+            return prediction["predicted_disease"], prediction["confidence_score"], None
+    start = time.perf_counter()
+    result, confidence = analyze_image(image)
+    if progress is not None:
+        progress("color analysis", time.perf_counter() - start)
+    return result, confidence, None
+
 def analyze_image(image):
     """Enhanced disease detection analysis using PIL and NumPy"""
     try:
-        img_array = np.array(image)
+        img_array = np.asarray(image)
         if len(img_array.shape) == 3:
-            # Calculate color statistics
-            red = np.mean(img_array[:, :, 0])
-            green = np.mean(img_array[:, :, 1])
-            blue = np.mean(img_array[:, :, 2])
+            # Calculate color statistics (one subsampled pass for all channels)
+            stats = image_stats(img_array, order="rgb")
+            red, green, blue = stats.mean_rgb
             
             # Calculate color ratios and statistics
             total_brightness = red + green + blue
@@ -178,10 +211,7 @@ def analyze_image(image):
             green_dominance = green - max(red, blue)
             
             # Calculate color variance for texture analysis
-            red_var = np.var(img_array[:, :, 0])
-            green_var = np.var(img_array[:, :, 1])
-            blue_var = np.var(img_array[:, :, 2])
-            color_variance = (red_var + green_var + blue_var) / 3
+            color_variance = sum(stats.var_rgb) / 3
             
             # Enhanced disease classification logic
             if green < 60 and red > 80 and blue < 70:
@@ -415,47 +445,50 @@ def main():
         """, unsafe_allow_html=True)
         
         if st.button("🔍 Analyze Disease", type="primary", use_container_width=True):
-            # Enhanced loading animation
+            # Progress follows the engine's real pipeline stages
             progress_bar = st.progress(0)
             status_text = st.empty()
+            status_text.text("🔍 Analyzing image...")
+            timings = []
             
-            # Simulate AI processing steps
-            steps = [
-                ("🔍 Preprocessing image...", 20),
-                ("🧠 Running AI analysis...", 50),
-                ("📊 Calculating confidence...", 80),
-                ("✅ Generating results...", 100)
-            ]
+            def on_stage(stage, seconds):
+                timings.append((stage, seconds))
+                label, percent = ANALYSIS_STAGES.get(stage, (stage, 100))
+                progress_bar.progress(percent)
+                status_text.text(f"{label} ({seconds * 1000:.0f} ms)")
             
-            for step_text, progress in steps:
-                status_text.text(step_text)
-                progress_bar.progress(progress)
-                time.sleep(0.5)
+            # Reuse the image opened above; draft() lets the JPEG decoder scale down
+            # to the smallest size still at least 224x224 instead of decoding every pixel
+            image.draft('RGB', (224, 224))
+            result, confidence, rejection = classify_upload(uploaded_file, image, on_stage)
             
             # Clear progress indicators
             progress_bar.empty()
             status_text.empty()
             
-            # Load and analyze image
-            image = Image.open(uploaded_file)
-            result, confidence = analyze_image(image)
-            
             # Enhanced results display
-            if result == "Healthy Leaves":
+            if rejection is not None:
+                st.markdown(f"""
+                <div class="results-card" style="background: linear-gradient(135deg, #9e9e9e, #757575); color: white;">
+                    <h3 style="text-align: center;">🚫 Invalid Input</h3>
+                    <p style="text-align: center; margin-top: 1rem;">{REJECTION_MESSAGES.get(rejection, "Please upload a clear leaf image.")}</p>
+                </div>
+                """, unsafe_allow_html=True)
+            elif lookup(result).indicator == "healthy":
                 st.markdown(f"""
                 <div class="results-card" style="background: linear-gradient(135deg, #4CAF50, #45a049); color: white;">
                     <h3 style="text-align: center;">🌿 {result}</h3>
                     <h4 style="text-align: center;">Confidence: {confidence:.1%}</h4>
-                    <p style="text-align: center; margin-top: 1rem;">Excellent! Your plant appears healthy.</p>
+                    <p style="text-align: center; margin-top: 1rem;">{INDICATOR_MESSAGES["healthy"]}</p>
                 </div>
                 """, unsafe_allow_html=True)
                 st.balloons()
-            elif result in ["BacterialBlight", "Tungro", "Brownspot (Rice)"]:
+            elif lookup(result).indicator == "severe":
                 st.markdown(f"""
                 <div class="results-card" style="background: linear-gradient(135deg, #f44336, #d32f2f); color: white;">
                     <h3 style="text-align: center;">🦠 {result}</h3>
                     <h4 style="text-align: center;">Confidence: {confidence:.1%}</h4>
-                    <p style="text-align: center; margin-top: 1rem;">Disease detected - immediate attention needed.</p>
+                    <p style="text-align: center; margin-top: 1rem;">{INDICATOR_MESSAGES["severe"]}</p>
                 </div>
                 """, unsafe_allow_html=True)
             else:
@@ -463,41 +496,37 @@ def main():
                 <div class="results-card" style="background: linear-gradient(135deg, #ff9800, #f57c00); color: white;">
                     <h3 style="text-align: center;">⚠️ {result}</h3>
                     <h4 style="text-align: center;">Confidence: {confidence:.1%}</h4>
-                    <p style="text-align: center; margin-top: 1rem;">Potential issue detected - monitor closely.</p>
+                    <p style="text-align: center; margin-top: 1rem;">{INDICATOR_MESSAGES["mild"]}</p>
                 </div>
                 """, unsafe_allow_html=True)
             
             # Detailed disease information in expandable cards
-            if result in disease_data:
-                info = disease_data[result]
+            info = BY_NAME.get(result)
+            if info is not None:
                 
                 st.markdown("---")
                 
                 # Disease type and symptoms
                 with st.expander("📋 Disease Information", expanded=True):
-                    st.markdown(f"**Type:** {info['Type']}")
+                    st.markdown(f"**Type:** {info.type}")
                     
                     col_sym, col_causes = st.columns(2)
                     with col_sym:
                         st.markdown("**🔍 Symptoms:**")
-                        for symptom in info['Symptoms']:
-                            st.markdown(f"• {symptom}")
+                        st.markdown(info.markdown["symptoms"])
                     
                     with col_causes:
-                        if 'Causes' in info:
+                        if info.causes:
                             st.markdown("**🔬 Causes:**")
-                            for cause in info['Causes']:
-                                st.markdown(f"• {cause}")
+                            st.markdown(info.markdown["causes"])
                 
                 # Management strategies
                 with st.expander("💊 Treatment & Management", expanded=True):
-                    strategies = info.get('Management Strategies', info.get('Management', []))
-                    for i, strategy in enumerate(strategies, 1):
-                        st.markdown(f"**{i}.** {strategy}")
+                    st.markdown(info.markdown["management"])
                 
                 # Recommendations
                 with st.expander("💡 Expert Recommendations", expanded=True):
-                    if result == "Healthy Leaves":
+                    if info.indicator == "healthy":
                         st.success("✅ **Continue current care routine**")
                         st.info("🔍 **Monitor regularly** for early detection of any changes")
                         st.info("🌱 **Maintain** current fertilization and watering schedule")
@@ -506,12 +535,19 @@ def main():
                         st.info("👨‍🌾 **Consult** with local agricultural extension officer")
                         st.info("📞 **Contact** plant pathology expert for severe cases")
                         st.info("📚 **Document** symptoms for treatment tracking")
+            
+            # Measured time per pipeline stage
+            if timings:
+                breakdown = " · ".join(f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in timings)
+                st.caption(f"⏱️ {breakdown} (total {sum(seconds for _, seconds in timings) * 1000:.0f} ms)")
+            else:
+                st.caption("⏱️ Reused the earlier result for this image")
         else:
             st.markdown("""
             <div class="info-card" style="text-align: center; padding: 2rem;">
                 <h4 style="color: #4CAF50;">Ready for Analysis! 🚀</h4>
                 <p>Click the button above to start AI-powered disease detection</p>
-                <p style="font-size: 0.9em; color: #666;">Analysis typically takes 2-3 seconds</p>
+                <p style="font-size: 0.9em; color: #666;">Results usually appear in under a second once the model is loaded</p>
             </div>
             """, unsafe_allow_html=True)
     
@@ -545,11 +581,11 @@ def main():
         """, unsafe_allow_html=True)
     
     with col3:
-        st.markdown("""
+        st.markdown(f"""
         <div class="metric-card pulse-animation">
             <h2>AI</h2>
             <p>Analysis Method</p>
-            <small>Color-based Detection</small>
+            <small>{"CNN Deep Learning" if INFERENCE_MODE == "cnn" else "Color-based Detection"}</small>
         </div>
         """, unsafe_allow_html=True)
     
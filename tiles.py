@@ -0,0 +1,116 @@
+# Tiled high-resolution scanning for DARTS system
+#
+# Squashing a 12 MP field photo to 224x224 shrinks a Brownspot or Leafsmut
+# lesion to a pixel or two. Tiled scanning classifies overlapping 224x224 tiles
+# of a high-resolution decode instead. The tiles are strided views into the one
+# pixel buffer; a subsampled green/dark probe drops tiles with no leaf in them,
+# and only the remaining leaf tiles are copied into CNN batches, so the cost
+# follows the amount of leaf in the picture rather than the image area.
+import math
+from collections import namedtuple
+
+import numpy as np
+import cv2
+from numpy.lib.stride_tricks import sliding_window_view
+
+from image_loader import MODEL_INPUT_SIZE
+from image_stats import LOWER_GREEN, UPPER_GREEN
+
+TILE_SIZE = MODEL_INPUT_SIZE[0]
+# Tiles overlap by half, so the heatmap grid has one cell per stride and each
+# tile covers exactly 2x2 cells
+TILE_STRIDE = TILE_SIZE // 2
+
+TileScan = namedtuple("TileScan", [
+    "probabilities",  # Image-level class scores aggregated from the tiles
+    "grid",           # (rows, cols) of tile positions
+    "cell_px",        # Heatmap cell size in pixels of the scanned image
+    "image_size",     # (width, height) of the scanned image
+    "leaf_tiles",     # Number of tiles classified
+    "lesion_tiles",   # {class index: tiles confidently showing it}
+    "heatmap",        # {class index: (rows+1, cols+1) mean score per cell, NaN where no leaf tile}
+])
+
+
+def tile_windows(rgb, tile=TILE_SIZE, stride=TILE_STRIDE):
+    """(rows, cols, tile, tile, 3) view of every tile of an image; no pixels are copied."""
+    windows = sliding_window_view(rgb, (tile, tile, rgb.shape[2]))
+    return windows[::stride, ::stride, 0]
+
+
+def fit_for_tiling(rgb, max_tiles, tile=TILE_SIZE, stride=TILE_STRIDE):
+    """Downscales an image whose tile grid would exceed max_tiles; returns (image, scale factor)."""
+    height, width = rgb.shape[:2]
+    tiles = ((height - tile) // stride + 1) * ((width - tile) // stride + 1)
+    if not max_tiles or tiles <= max_tiles:
+        return rgb, 1.0
+    factor = max(math.sqrt(max_tiles / tiles), tile / min(height, width))
+    size = (max(tile, int(width * factor)), max(tile, int(height * factor)))
+    return cv2.resize(rgb, size, interpolation=cv2.INTER_AREA), factor
+
+
+def leaf_mask(windows, dark_threshold=15, max_dark_ratio=0.5, min_green_percentage=10.0, step=8):
+    """Boolean (rows, cols) mask of tiles worth classifying, from every ``step``-th pixel of each tile."""
+    probe = np.ascontiguousarray(windows[:, :, ::step, ::step])
+    rows, cols, side = probe.shape[:3]
+    flat = probe.reshape(rows * cols * side, side, 3)
+    green = cv2.inRange(cv2.cvtColor(flat, cv2.COLOR_RGB2HSV), LOWER_GREEN, UPPER_GREEN)
+    gray = cv2.cvtColor(flat, cv2.COLOR_RGB2GRAY)
+    green_percentage = np.count_nonzero(green.reshape(rows, cols, -1), axis=2) / (side * side) * 100
+    dark_ratio = np.count_nonzero(gray.reshape(rows, cols, -1) < dark_threshold, axis=2) / (side * side)
+    return (green_percentage >= min_green_percentage) & (dark_ratio <= max_dark_ratio)
+
+
+def scan_tiles(rgb, classify_fn, batch_size=32, max_tiles=256, healthy_class=None,
+               min_confidence=0.5, min_lesion_tiles=2):
+    """Classifies the leaf tiles of an RGB uint8 image. Returns a TileScan, or None if no tile has leaf.
+
+    classify_fn maps a float32 batch in [0, 1] to class scores. The image-level
+    scores average every leaf tile, unless at least ``min_lesion_tiles`` tiles
+    confidently show a class other than ``healthy_class``: then only those
+    lesion tiles are averaged, so a few diseased patches on an otherwise
+    healthy field are reported rather than outvoted.
+    """
+    if min(rgb.shape[:2]) < TILE_SIZE:
+        return None
+    rgb, _ = fit_for_tiling(rgb, max_tiles)
+    windows = tile_windows(rgb)
+    rows, cols = windows.shape[:2]
+    mask = leaf_mask(windows)
+    positions = np.argwhere(mask)
+    if not len(positions):
+        return None
+
+    # Only leaf tiles are copied out of the strided view, one batch at a time
+    scores = []
+    for start in range(0, len(positions), batch_size):
+        chunk = positions[start:start + batch_size]
+        batch = windows[chunk[:, 0], chunk[:, 1]].astype(np.float32) / 255.0
+        scores.append(np.asarray(classify_fn(batch)))
+    scores = np.concatenate(scores)
+
+    labels = scores.argmax(axis=1)
+    confident = scores.max(axis=1) >= min_confidence
+    counts = np.bincount(labels[confident], minlength=scores.shape[1])
+    lesion = confident & (labels != healthy_class) & (counts[labels] >= min_lesion_tiles)
+    probabilities = scores[lesion].mean(axis=0) if lesion.any() else scores.mean(axis=0)
+
+    # Each tile adds its scores to the 2x2 heatmap cells it covers
+    sums = np.zeros((rows + 1, cols + 1, scores.shape[1]))
+    hits = np.zeros((rows + 1, cols + 1))
+    for dy in (0, 1):
+        for dx in (0, 1):
+            np.add.at(sums, (positions[:, 0] + dy, positions[:, 1] + dx), scores)
+            np.add.at(hits, (positions[:, 0] + dy, positions[:, 1] + dx), 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cells = sums / hits[:, :, None]
+
+    return TileScan(
+        probabilities=probabilities,
+        grid=(rows, cols),
+        cell_px=TILE_STRIDE,
+        image_size=(rgb.shape[1], rgb.shape[0]),
+        leaf_tiles=len(positions),
+        lesion_tiles={int(c): int(n) for c, n in enumerate(counts) if n},
+        heatmap={int(c): cells[:, :, c] for c in np.unique(labels)},
+    )
@@ -0,0 +1,108 @@
+# Test-time augmentation for DARTS system
+#
+# A single resized view of a wide field photo shrinks an off-center lesion to a
+# few pixels. TTA classifies several crops/flips of the same decoded image in
+# one stacked forward pass and averages their probabilities. ViewBudget caps
+# the number of views so that pass stays within a latency budget.
+import threading
+
+import cv2
+
+from image_loader import MODEL_INPUT_SIZE
+
+
+def _resize(rgb):
+    # Nearest-neighbour, like DecodedImage.model_input(), so view 0 is the plain prediction
+    return cv2.resize(rgb, MODEL_INPUT_SIZE, interpolation=cv2.INTER_NEAREST)
+
+
+def _square(rgb, position):
+    """Square crop of the shorter side at the start, center or end of the longer side."""
+    height, width = rgb.shape[:2]
+    side = min(height, width)
+    offset = {"start": 0, "center": (max(height, width) - side) // 2, "end": max(height, width) - side}[position]
+    if width >= height:
+        return rgb[:, offset:offset + side]
+    return rgb[offset:offset + side, :]
+
+
+def _zoom(rgb, fraction=0.8):
+    """Centered crop covering ``fraction`` of the shorter side."""
+    height, width = rgb.shape[:2]
+    side = int(min(height, width) * fraction)
+    top, left = (height - side) // 2, (width - side) // 2
+    return rgb[top:top + side, left:left + side]
+
+
+# In priority order: when the view count is capped, the first views are kept
+_VIEWS = (
+    lambda rgb: _resize(rgb),
+    lambda rgb: _resize(rgb)[:, ::-1],
+    lambda rgb: _resize(_square(rgb, "center")),
+    lambda rgb: _resize(_square(rgb, "start")),
+    lambda rgb: _resize(_square(rgb, "end")),
+    lambda rgb: _resize(_zoom(rgb)),
+    lambda rgb: _resize(_square(rgb, "center"))[:, ::-1],
+    lambda rgb: _resize(rgb)[::-1, :],
+)
+MAX_VIEWS = len(_VIEWS)
+
+
+def augment_views(rgb, count):
+    """Returns ``count`` 224x224 RGB uint8 views of an image (1 <= count <= MAX_VIEWS)."""
+    return [view(rgb) for view in _VIEWS[:max(1, min(count, MAX_VIEWS))]]
+
+
+class ViewBudget:
+    """Chooses how many TTA views to run from the measured cost of a view.
+
+    Each forward pass reports its duration and row count; the per-view cost is
+    an exponential moving average of seconds per row. ``views(n_images)``
+    returns the largest count up to ``max_views`` for which the whole stacked
+    pass of ``n_images * views`` rows is estimated to fit in ``budget_ms``
+    (never fewer than 1). budget_ms=0 disables the cap.
+    """
+
+    def __init__(self, max_views, budget_ms=0, alpha=0.2):
+        self.max_views = max(1, min(int(max_views), MAX_VIEWS))
+        self.budget = max(0.0, float(budget_ms)) / 1000.0
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._view_seconds = None
+        self._passes = 0
+        self._views_run = 0
+        self._capped = 0
+
+    def views(self, n_images=1):
+        """Views per image for one forward pass over ``n_images`` images."""
+        with self._lock:
+            if not self.budget or self._view_seconds is None:
+                return self.max_views
+            pass_seconds = self._view_seconds * max(1, n_images)
+            affordable = int(self.budget / pass_seconds) if pass_seconds > 0 else self.max_views
+            views = max(1, min(self.max_views, affordable))
+            if views < self.max_views:
+                self._capped += 1
+            return views
+
+    def record(self, seconds, rows, views):
+        """Records one forward pass of ``rows`` stacked inputs, ``views`` per image."""
+        per_view = seconds / max(1, rows)
+        with self._lock:
+            if self._view_seconds is None:
+                self._view_seconds = per_view
+            else:
+                self._view_seconds = self.alpha * per_view + (1.0 - self.alpha) * self._view_seconds
+            self._passes += 1
+            self._views_run += views
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_views": self.max_views,
+                "budget_ms": self.budget * 1000.0,
+                "view_ms": None if self._view_seconds is None else self._view_seconds * 1000.0,
+                "passes": self._passes,
+                "mean_views": (self._views_run / self._passes) if self._passes else 0.0,
+                "capped": self._capped,
+            }
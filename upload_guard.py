@@ -0,0 +1,99 @@
+# Early upload rejection for DARTS system
+#
+# MAX_CONTENT_LENGTH makes Flask refuse a body whose declared size is too big
+# before reading any of it. GuardedRequest also checks each multipart file as
+# it streams in: a non-JPEG/PNG signature or decompression-bomb dimensions stop
+# parsing after the first chunk, before the rest is read, saved or decoded.
+# Batch endpoints can opt into per-part rejection instead: a part with the
+# wrong signature is then dropped and marked, and the other parts still parse.
+from flask import Request
+from werkzeug.exceptions import HTTPException
+
+from image_loader import HEADER_PROBE_BYTES, MAX_IMAGE_PIXELS, probe_image
+
+# Bytes needed to recognize a signature and, for PNG, read the IHDR size
+_MIN_PROBE_BYTES = 24
+
+
+class UploadRejected(HTTPException):
+    """An upload refused while streaming; ``reason`` is a short machine-readable code."""
+
+    code = 415
+
+    def __init__(self, reason, description, code=None):
+        super().__init__(description)
+        self.reason = reason
+        if code is not None:
+            self.code = code
+
+
+def check_image_header(header, max_pixels=MAX_IMAGE_PIXELS):
+    """Raises UploadRejected for non-images and oversized dimensions.
+
+    Returns True once the size has been read and accepted, False if more
+    header bytes are needed.
+    """
+    image_format, width, height = probe_image(header)
+    if image_format is None:
+        raise UploadRejected("unsupported_format", "Only JPEG and PNG images are accepted.")
+    if width is None:
+        return False
+    if width * height > max_pixels:
+        raise UploadRejected(
+            "too_many_pixels",
+            f"Image is {width}x{height} pixels; at most {max_pixels / 1e6:.0f} megapixels are accepted.",
+            code=413
+        )
+    return True
+
+
+class GuardedFileStream:
+    """Wraps the spool Werkzeug writes one uploaded file into, checking its header as it arrives.
+
+    With ``per_part`` set, a non-image part is not an error for the whole
+    request: its data is discarded and ``rejected`` holds the UploadRejected.
+    Decompression bombs still abort the request.
+    """
+
+    def __init__(self, stream, max_pixels, per_part=False):
+        self._stream = stream
+        self._max_pixels = max_pixels
+        self._per_part = per_part
+        self._header = b""
+        self._checked = False
+        self.rejected = None
+
+    def write(self, data):
+        if self.rejected is not None:
+            return len(data)
+        if not self._checked and len(self._header) < HEADER_PROBE_BYTES:
+            self._header += bytes(data[:HEADER_PROBE_BYTES - len(self._header)])
+            if len(self._header) >= _MIN_PROBE_BYTES:
+                try:
+                    self._checked = check_image_header(self._header, self._max_pixels)
+                except UploadRejected as e:
+                    if not self._per_part or e.reason != "unsupported_format":
+                        raise
+                    self.rejected = e
+                    return len(data)
+        return self._stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class GuardedRequest(Request):
+    """Flask request class whose multipart file parts are header-checked while streaming."""
+
+    max_image_pixels = MAX_IMAGE_PIXELS
+    # Set (before the form is first read) by views that report non-image parts per item
+    reject_parts_individually = False
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return GuardedFileStream(stream, self.max_image_pixels, per_part=self.reject_parts_individually)
+
+
+def part_rejection(file_storage):
+    """The UploadRejected for a multipart file dropped by per-part checking, or None."""
+    return getattr(file_storage.stream, "rejected", None)
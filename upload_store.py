@@ -0,0 +1,175 @@
+# Bounded, content-addressed upload storage for DARTS system
+import hashlib
+import os
+import re
+import threading
+import time
+
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+)
+
+_STORED_NAME = re.compile(r"^[0-9a-f]{64}\.(jpg|png)$")
+
+
+def sniff_extension(data, filename=None):
+    """Returns the real image extension from the magic bytes, falling back to the filename."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if filename and '.' in filename:
+        extension = filename.rsplit('.', 1)[1].lower()
+        return 'jpg' if extension == 'jpeg' else extension
+    return 'bin'
+
+
+class UploadStore:
+    """Stores uploads as <sha256>.<ext> in sharded subdirectories with TTL/size-based eviction.
+
+    Identical uploads share one file, different uploads never overwrite each
+    other, and a background sweeper keeps disk usage under ``max_bytes``. The
+    sweeper runs every ``sweep_interval`` seconds, and straight away when the
+    running byte total kept by save() goes over ``max_bytes``.
+    """
+
+    def __init__(self, root='uploads', max_bytes=200 * 1024 * 1024, ttl_seconds=24 * 3600, sweep_interval=300):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._saved_during_sweep = None  # Bytes saved while a sweep walks the tree, None when idle
+        self._stats = {"saved": 0, "deduplicated": 0, "expired": 0, "evicted": 0, "bytes": 0, "files": 0}
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, data, filename=None):
+        """Stores the bytes (if not already present) and returns the public file name."""
+        self._ensure_sweeper()
+        name = f"{hashlib.sha256(data).hexdigest()}.{sniff_extension(data, filename)}"
+        path = self._path(name)
+        try:
+            os.utime(path)  # Already stored: refresh so the sweeper treats it as recently used
+            with self._lock:
+                self._stats["deduplicated"] += 1
+            return name
+        except OSError:
+            pass
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats["saved"] += 1
+            self._stats["bytes"] += len(data)
+            self._stats["files"] += 1
+            if self._saved_during_sweep is not None:
+                self._saved_during_sweep += len(data)
+            over_budget = self._stats["bytes"] > self.max_bytes
+        if over_budget:
+            if self.sweep_interval > 0:
+                self._wake.set()
+            else:
+                self.sweep()
+        return name
+
+    def locate(self, name):
+        """Returns (directory, file name) for a stored name, or None for invalid/missing names."""
+        if not _STORED_NAME.match(name):
+            return None
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        return os.path.dirname(path), name
+
+    def read(self, name):
+        """Returns the stored bytes for a name, or None if it is invalid or was evicted."""
+        located = self.locate(name)
+        if located is None:
+            return None
+        try:
+            with open(os.path.join(*located), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def sweep(self):
+        """Deletes expired files, then the oldest files until the store fits in max_bytes."""
+        with self._sweep_lock:
+            self._sweep()
+
+    def _sweep(self):
+        with self._lock:
+            self._saved_during_sweep = 0
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    if now - st.st_mtime > 3600:
+                        self._remove(path)  # Leftover from a crashed write
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        expired = [f for f in files if now - f[0] > self.ttl_seconds]
+        for _, _, path in expired:
+            self._remove(path)
+        files = sorted(f for f in files if now - f[0] <= self.ttl_seconds)
+
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        while files and total > self.max_bytes:
+            _, size, path = files.pop(0)
+            self._remove(path)
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._stats["expired"] += len(expired)
+            self._stats["evicted"] += evicted
+            # Files saved after the walk started may or may not have been seen; counting them
+            # again only overestimates until the next sweep
+            self._stats["bytes"] = total + self._saved_during_sweep
+            self._stats["files"] = len(files)
+            self._saved_during_sweep = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, max_bytes=self.max_bytes, ttl_seconds=self.ttl_seconds)
+
+    def _path(self, name):
+        return os.path.join(self.root, name[:2], name[2:4], name)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _ensure_sweeper(self):
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_forever, name="upload-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_forever(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: upload sweep failed: {e}")
+            self._wake.wait(self.sweep_interval)
+            self._wake.clear()
@@ -0,0 +1,110 @@
+# Tiered image validation cascade for DARTS system
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+# ImageNet-1k class indices that show up for leaf / crop / field photos.
+# Close-ups of leaves are often labelled as the insects that live on them,
+# so the insect block is included alongside fruits, vegetables and plants.
+PLANT_IMAGENET_CLASSES = frozenset(
+    list(range(301, 327))      # ladybug ... lycaenid (leaf beetle, leafhopper, grasshopper, butterflies)
+    + list(range(936, 959))    # head cabbage ... hay (vegetables, fruits)
+    + list(range(984, 999))    # rapeseed, daisy, corn, acorn, fungi, ear/spike
+    + [580, 738]               # greenhouse, pot (flowerpot)
+)
+
+Verdict = namedtuple("Verdict", ["valid", "stage", "reason"])
+
+
+def sharpness(gray):
+    """Variance of the Laplacian; near zero for flat or heavily blurred images."""
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+class ValidationCascade:
+    """Runs cheap checks first and only falls back to the ImageNet model when they are inconclusive.
+
+    Stages, in order: darkness (reject), green ratio (accept), blur (reject),
+    model (accept if any top-k class is plant-related).
+    """
+
+    STAGES = ("darkness", "green", "blur", "model")
+
+    def __init__(self, classify_fn, dark_threshold=15, black_ratio=0.98, green_accept=20.0,
+                 blur_threshold=2.0, plant_classes=PLANT_IMAGENET_CLASSES, top_k=5):
+        self.classify_fn = classify_fn
+        self.dark_threshold = dark_threshold
+        self.black_ratio = black_ratio
+        self.green_accept = green_accept
+        self.blur_threshold = blur_threshold
+        self.plant_classes = plant_classes
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._stats = {
+            stage: {"calls": 0, "accepted": 0, "rejected": 0, "passed": 0, "total_ms": 0.0}
+            for stage in self.STAGES
+        }
+
+    def check_darkness(self, decoded):
+        """Stage 1: rejects images that are mostly black. Returns a Verdict or None to continue."""
+        start = time.perf_counter()
+        ratio = decoded.image_stats(self.dark_threshold).dark_ratio
+        verdict = Verdict(False, "darkness", "too_dark") if ratio > self.black_ratio else None
+        self._record("darkness", verdict, start)
+        return verdict
+
+    def check_plant(self, decoded):
+        """Stages 2-4: green ratio, blur, then the plant-class model check. Always returns a Verdict."""
+        start = time.perf_counter()
+        verdict = None
+        if decoded.image_stats(self.dark_threshold).green_percentage > self.green_accept:
+            verdict = Verdict(True, "green", "green_content")
+        self._record("green", verdict, start)
+        if verdict is not None:
+            return verdict
+
+        start = time.perf_counter()
+        small_gray = cv2.cvtColor(decoded.model_input(), cv2.COLOR_RGB2GRAY)
+        if sharpness(small_gray) < self.blur_threshold:
+            verdict = Verdict(False, "blur", "too_blurry")
+        self._record("blur", verdict, start)
+        if verdict is not None:
+            return verdict
+
+        start = time.perf_counter()
+        predictions = np.asarray(self.classify_fn(decoded.model_input()))
+        top_classes = np.argsort(predictions)[-self.top_k:]
+        if any(int(c) in self.plant_classes for c in top_classes):
+            verdict = Verdict(True, "model", "plant_class")
+        else:
+            verdict = Verdict(False, "model", "not_plant")
+        self._record("model", verdict, start)
+        return verdict
+
+    def validate(self, decoded):
+        """Runs the full cascade and returns the deciding Verdict."""
+        return self.check_darkness(decoded) or self.check_plant(decoded)
+
+    def stats(self):
+        """Per-stage call counts, decisions and timing."""
+        with self._lock:
+            return {
+                stage: dict(values, mean_ms=(values["total_ms"] / values["calls"]) if values["calls"] else 0.0)
+                for stage, values in self._stats.items()
+            }
+
+    def _record(self, stage, verdict, start):
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        with self._lock:
+            entry = self._stats[stage]
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            if verdict is None:
+                entry["passed"] += 1
+            elif verdict.valid:
+                entry["accepted"] += 1
+            else:
+                entry["rejected"] += 1